@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+'''
+AGI DATA
+Loaded once per process, from a versioned binary sidecar of agi_data.csv
+'''
+# Import packages for loading the data
+import hashlib
+import json
+import numpy as np
+import os
+
+
+'''
+PATHS AND VERSION
+'''
+# The csv is the source, the sidecar files are generated from it
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'data')
+csv_path = os.path.join(data_dir, 'agi_data.csv')
+npy_path = os.path.join(data_dir, 'agi_data.npy')
+meta_path = os.path.join(data_dir, 'agi_data.meta.json')
+sidecar_format = 1  # Increment when the sidecar layout changes
+
+# Hash the csv without parsing it, so edits always rebuild the sidecar
+def csv_version():
+	with open(csv_path, 'rb') as f:
+		digest = hashlib.md5(f.read()).hexdigest()
+	return '{}-{}'.format(sidecar_format, digest)
+
+
+'''
+LOADING
+'''
+# Parse the csv with pandas, only needed when the sidecar is missing or stale
+def parse_csv():
+	import pandas as pd
+	df = pd.read_csv(csv_path, index_col=0)
+	return [str(b) for b in df.index.tolist()], df.values.astype(np.float64)
+
+# Write the sidecar next to the csv, replacing any old files atomically
+def write_sidecar(labels, matrix, version):
+	tmp_npy = '{}.{}.tmp'.format(npy_path, os.getpid())
+	tmp_meta = '{}.{}.tmp'.format(meta_path, os.getpid())
+	with open(tmp_npy, 'wb') as f:
+		np.save(f, matrix)
+	with open(tmp_meta, 'w') as f:
+		json.dump({'version': version, 'labels': labels}, f)
+	os.rename(tmp_npy, npy_path)
+	os.rename(tmp_meta, meta_path)  # Written last, so it only points at a full matrix
+
+# Memory-map the sidecar when it matches the csv, otherwise rebuild it
+def load_agi_data():
+	version = csv_version()
+	try:
+		with open(meta_path) as f:
+			meta = json.load(f)
+		if meta['version'] == version:
+			labels = [str(b) for b in meta['labels']]
+			return labels, np.load(npy_path, mmap_mode='r')
+	except (IOError, OSError, ValueError, KeyError):
+		pass
+
+	# Parse the csv and try to save the sidecar for the next worker
+	labels, matrix = parse_csv()
+	try:
+		write_sidecar(labels, matrix, version)
+	except (IOError, OSError):
+		pass  # Read-only filesystems still work from the csv
+	return labels, matrix
+
+
+'''
+SHARED DATA
+'''
+# Rows are AGI ranges and columns are the income bands taxed at each rate
+x, agi_matrix = load_agi_data()  # x-axis on most graphs
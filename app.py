@@ -2,6 +2,10 @@
 '''
 IMPORT FLASK AND DASH APPS
 '''
+# Log warnings and errors from the background threads with the server's output
+import logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
 # Each dash file needs to imported
 from server import app
 from dash_templates.tax_input import dash_app_input
@@ -10,6 +14,7 @@ from dash_templates.tax_results import dash_app_results
 '''
 RUN APP
 '''
-# Run app in debug
+# Run app in debug, reloading when the data behind the cached renders changes
 if __name__ == '__main__':
-    app.run(debug=True)
+    from dash_templates.render_cache import watched_files
+    app.run(debug=True, extra_files=watched_files)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+'''
+FIGURE TEMPLATE BENCHMARK
+Execute to compare per-call latency of plotly objects and the templates
+'''
+# Import packages for timing
+import json
+import os
+import re
+import sys
+import timeit
+
+# Import from the app directories
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [root, os.path.join(root, 'dash_templates')]
+import plotly
+import plotly.graph_objs as go
+from figures import example_bar_graphs, tax_rate_bar
+from styling import colors, font
+from tax_engine import brackets, x
+
+
+'''
+PLOTLY OBJECTS BEFORE THE TEMPLATES
+'''
+# Tax rate bar built with go.Figure on every call
+def legacy_tax_rate_bar(tax_rates, title):
+	rates = [round(tax_rates[v] * 100.0, 2) for v in x]
+	tax_data = [{
+		'x': [re.sub(',00[0|1]', 'k', k) for k in x],
+		'y': rates,
+		'type': 'bar',
+		'hoverinfo': 'y',
+		'marker': {'color': colors}
+	}]
+	return go.Figure(
+		data=tax_data,
+		layout=go.Layout(
+			title=title,
+			titlefont={'family': font},
+			yaxis={
+				'title': 'Tax Rate for Bracket',
+				'titlefont': {'family': font},
+				'ticksuffix': '%',
+				'range': [0, max(max(rates), 17.5)]
+			},
+			xaxis={
+				'title': 'Income Bracket',
+				'titlefont': {'family': font}
+			},
+			showlegend=False
+		)
+	)
+
+# Example bar built with go.Bar traces on every call
+def legacy_example_bar_graphs(values):
+	agi = values[0]
+	taxes = values[1:]
+	income_brackets = []
+	for i, b in enumerate(brackets):
+		if b[0] < agi:
+			amt = min(b[1], agi) - b[0]
+			income_brackets.append(go.Bar(
+				x=[amt],
+				y=[agi],
+				name=re.sub(',00[0|1]', 'k', x[i]),
+				text='{:,.2f}%'.format(taxes[i] * 100.0),
+				textposition='auto',
+				hoverinfo='name',
+				orientation='h',
+				hoverlabel={'bgcolor': colors[i], 'font': {'family': font}},
+				marker={'color': colors[i]}
+			))
+	return go.Figure(
+		data=income_brackets,
+		layout=go.Layout(
+			barmode='stack',
+			title={'text': 'Income Tax Rates<br>for ${:,.0f}'.format(agi)},
+			titlefont={'family': font},
+			showlegend=False,
+			height=220,
+			xaxis={'tickprefix': '$', 'range': [0, agi]}
+		)
+	)
+
+
+'''
+RUN BENCHMARK
+'''
+# Time building and encoding a figure, as Dash does for each response
+def per_call(func, args, number):
+	def call():
+		json.dumps(func(*args), cls=plotly.utils.PlotlyJSONEncoder)
+	return min(timeit.repeat(call, number=number, repeat=5)) / number
+
+# Print the microseconds per call before and after for each figure
+if __name__ == '__main__':
+	number = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+	rates = {k:0.0495 for k in x}
+	values = (250000, 0.03, 0.04, 0.05, 0.06, 0.07)
+	cases = [
+		('tax_rate_bar', legacy_tax_rate_bar, tax_rate_bar, (rates, 'Title')),
+		('example_bar_graphs', legacy_example_bar_graphs, example_bar_graphs, (values,))
+	]
+	for name, before, after, args in cases:
+		old = per_call(before, args, number) * 1e6
+		new = per_call(after, args, number) * 1e6
+		print('{:<20} before {:>9.1f} us  after {:>9.1f} us  speedup {:>5.1f}x'.format(
+			name, old, new, old / new))
\ No newline at end of file
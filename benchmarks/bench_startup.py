@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+'''
+STARTUP BENCHMARK
+Execute to time a cold import of app.py, as on a dyno restart
+'''
+# Import packages for timing subprocesses
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Run from the app directory so the imports match gunicorn
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+'''
+MEASUREMENTS
+'''
+# Wall clock seconds for a fresh interpreter to import the module
+def cold_start(module):
+	start = time.time()
+	subprocess.check_call(
+		[sys.executable, '-c', 'import {}'.format(module)], cwd=root)
+	return time.time() - start
+
+# Cumulative microseconds per module from -X importtime, on Python 3.7+
+def import_times(module):
+	if sys.version_info < (3, 7):
+		return {}
+	proc = subprocess.Popen(
+		[sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+		cwd=root, stderr=subprocess.PIPE, universal_newlines=True)
+	_, stderr = proc.communicate()
+
+	# Lines look like: import time:   self [us] | cumulative | imported package
+	times = {}
+	for line in stderr.splitlines():
+		if not line.startswith('import time:') or 'imported package' in line:
+			continue
+		_, cumulative, name = line[len('import time:'):].split('|')
+		times[name.strip()] = int(cumulative)
+	return times
+
+
+'''
+RUN BENCHMARK
+'''
+# Report the median cold start and the slowest imports, failing over the budget
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--module', default='app')
+	parser.add_argument(
+		'--baseline', default='dash,dash_core_components,dash_html_components',
+		help='Imports the app needs anyway, timed separately, e.g. Dash, which loads plotly and pandas')
+	parser.add_argument('--runs', type=int, default=5)
+	parser.add_argument('--top', type=int, default=15)
+	parser.add_argument('--max-ms', type=float, help='Fail if the median exceeds this')
+	parser.add_argument('--json', action='store_true', help='Machine-readable output')
+	args = parser.parse_args()
+
+	# Median of several runs, since the first one warms the disk cache
+	runs = sorted(cold_start(args.module) for _ in range(args.runs))
+	median_ms = runs[len(runs) // 2] * 1000.0
+	baseline = sorted(cold_start(args.baseline) for _ in range(args.runs)) if args.baseline else None
+	baseline_ms = baseline[len(baseline) // 2] * 1000.0 if baseline else None
+	times = import_times(args.module)
+	slowest = sorted(times.items(), key=lambda t: -t[1])[:args.top]
+
+	# Print the results
+	if args.json:
+		print(json.dumps({
+			'module': args.module,
+			'median_ms': median_ms,
+			'runs_ms': [r * 1000.0 for r in runs],
+			'baseline': args.baseline,
+			'baseline_ms': baseline_ms,
+			'slowest_imports_us': slowest
+		}, indent=4))
+	else:
+		print('Cold import of {}: median {:.1f} ms over {} runs'.format(
+			args.module, median_ms, args.runs))
+		if baseline_ms is not None:
+			print('Cold import of {}: median {:.1f} ms, leaving {:.1f} ms for the app'.format(
+				args.baseline, baseline_ms, median_ms - baseline_ms))
+		for name, us in slowest:
+			print('{:>10.1f} ms  {}'.format(us / 1000.0, name))
+
+	# Exit non-zero so a regression fails the build
+	if args.max_ms is not None and median_ms > args.max_ms:
+		sys.exit('Cold import took {:.1f} ms, over the {:.1f} ms budget'.format(
+			median_ms, args.max_ms))
\ No newline at end of file
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+'''
+LOAD TEST
+Execute to replay slider sessions against app:app under gunicorn,
+using the local SQLite storage backend instead of DynamoDB
+'''
+# Import packages for the server, clients, and timings
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+# urllib2 was split up in Python 3
+try:
+	from urllib2 import Request, urlopen
+except ImportError:
+	from urllib.request import Request, urlopen
+
+# Run from the app directory so the imports match gunicorn
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+from agi_data import x  # Bracket labels in slider order
+
+# Presets and slider settings, matching tax_input.py
+presets = {
+	'IL_2017': [0.0495] * 5,
+	'IN_2018': [0.0323] * 5,
+	'IA_2018': [0.0243, 0.0648, 0.0792, 0.0898, 0.0898],
+	'KS_2018': [0.027] + ([0.046] * 4),
+	'MI_2018': [0.0425] * 5,
+	'MN_2018': [0.0535, 0.0705, 0.0785, 0.0985, 0.0985],
+	'MO_2018': [0.06] * 5,
+	'NE_2018': [0.0246] + ([0.0684] * 4),
+	'OH_2018': [0.02476, 0.02969, 0.0396, 0.04597, 0.04997],
+	'WI_2018': [0.04, 0.0627, 0.0627, 0.0627, 0.0765]
+}
+slider_step = 0.0005
+
+# Short names for the server callbacks, keyed by their first output
+callback_names = {
+	'slider-0.value': 'dropdown',
+	'session-id.children': 'submit',
+	'tax-revenue-bar.figure': 'rates'
+}
+
+
+'''
+SERVER
+'''
+# Start gunicorn on a free port with the local storage backend
+def start_server(port, workers, storage_path):
+	env = dict(os.environ)
+	env.pop('ON_HEROKU', None)  # Use the remote address, which skips GeoIP
+	env['STORAGE_BACKEND'] = 'sqlite'
+	env['STORAGE_PATH'] = storage_path
+	return subprocess.Popen(
+		[sys.executable, '-m', 'gunicorn', 'app:app', '--preload',
+			'--workers', str(workers), '--bind', '127.0.0.1:{}'.format(port)],
+		cwd=root, env=env)
+
+# Wait until the server answers the Dash dependencies route
+def wait_for_server(url, timeout=60.0):
+	deadline = time.time() + timeout
+	while time.time() < deadline:
+		try:
+			return json.loads(urlopen(url + '/_dash-dependencies').read().decode('utf-8'))
+		except Exception:
+			time.sleep(0.25)
+	raise RuntimeError('Server at {} did not start'.format(url))
+
+
+'''
+SESSIONS
+'''
+# A session loads the page, drags sliders, may pick a preset, and may submit
+def synthetic_session(rng, drags=6, dropdown_chance=0.3, submit_chance=0.5):
+	events = []
+	rates = list(presets['IL_2017'])
+	for _ in range(drags):
+
+		# Picking a preset moves every slider at once
+		if rng.random() < dropdown_chance:
+			choice = rng.choice(sorted(presets))
+			events.append({'type': 'dropdown', 'value': choice, 'rates': list(rates)})
+			rates = list(presets[choice])
+
+		# A drag sends an event for each step the slider passes
+		i = rng.randrange(len(x))
+		target = round(rng.uniform(0.0, 0.15) / slider_step) * slider_step
+		steps = max(1, min(20, int(abs(target - rates[i]) / slider_step)))
+		start = rates[i]
+		for s in range(1, steps + 1):
+			rates[i] = round(start + (target - start) * s / float(steps), 4)
+			events.append({'type': 'slider', 'rates': list(rates)})
+	if rng.random() < submit_chance:
+		events.append({'type': 'submit', 'rates': list(rates)})
+	return events
+
+# Sessions recorded in a SQLite storage file, replayed in timestamp order
+def recorded_sessions(path):
+	conn = sqlite3.connect(path)
+	sessions = {}
+	for session_id, item in conn.execute(
+			'SELECT session_id, item FROM sessions ORDER BY session_id, timestamp'):
+		item = json.loads(item)
+		rates = [float(item['tax_rates'][k]) for k in x]
+		event_type = 'submit' if item.get('type') == 'submit' else 'slider'
+		sessions.setdefault(session_id, []).append({'type': event_type, 'rates': rates})
+	conn.close()
+	return list(sessions.values())
+
+
+'''
+REQUESTS
+'''
+# Request body for a callback, with the values of its inputs and state
+def callback_body(dependency, values):
+	def props(deps):
+		return [
+			{'id': d['id'], 'property': d['property'], 'value': values.get(
+				'{}.{}'.format(d['id'], d['property']))}
+			for d in deps
+		]
+	return {
+		'output': dependency['output'],
+		'inputs': props(dependency['inputs']),
+		'state': props(dependency['state']),
+		'changedPropIds': ['{}.{}'.format(d['id'], d['property'])
+			for d in dependency['inputs']]
+	}
+
+# Component values after an event, keyed like Dash's prop ids
+def component_values(session_id, rates, choice, clicks):
+	values = {'slider-{}.value'.format(i): r for i, r in enumerate(rates)}
+	values['session-id.children'] = session_id
+	values['input-agi-calc.value'] = 50000
+	values['slider-dropdown.value'] = choice
+	values['results-btn.n_clicks'] = clicks
+	return values
+
+# Send one request, recording its latency and whether it failed
+def timed_request(url, name, results, body=None):
+	data = json.dumps(body).encode('utf-8') if body is not None else None
+	request = Request(url, data=data, headers={'Content-Type': 'application/json'})
+	start = time.time()
+	try:
+		response = urlopen(request, timeout=30)
+		response.read()
+		ok = True
+	except Exception:
+		ok = False  # HTTP errors, including callback exceptions, and timeouts
+	results.append((name, time.time() - start, ok))
+
+# Replay one session's events against the server
+def replay(url, callbacks, events, results):
+	session_id = str(uuid.uuid4())
+	choice = 'IL_2017'
+	clicks = 0
+	timed_request(url + '/_dash-layout', 'layout', results)
+	for event in events:
+		if event['type'] == 'dropdown':
+			values = component_values(session_id, event['rates'], event['value'], clicks)
+			name = 'dropdown'
+			choice = event['value']
+		elif event['type'] == 'submit':
+			clicks += 1
+			values = component_values(session_id, event['rates'], choice, clicks)
+			name = 'submit'
+		else:
+			values = component_values(session_id, event['rates'], choice, clicks)
+			name = 'rates'
+		if name in callbacks:
+			timed_request(url + '/_dash-update-component', name, results,
+				callback_body(callbacks[name], values))
+
+# Run the sessions across client threads for the duration or until done
+def run_clients(url, callbacks, sessions, clients, duration):
+	results = []
+	queue = list(sessions)
+	lock = threading.Lock()
+	deadline = time.time() + duration if duration else None
+
+	# Each client takes the next session until they run out or time is up
+	def client():
+		while deadline is None or time.time() < deadline:
+			with lock:
+				if not queue:
+					return
+				events = queue.pop()
+			replay(url, callbacks, events, results)
+
+	threads = [threading.Thread(target=client) for _ in range(clients)]
+	start = time.time()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	return results, time.time() - start
+
+
+'''
+REPORT
+'''
+# Nearest-rank percentile of sorted values
+def percentile(values, p):
+	if not values:
+		return 0.0
+	return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+# Latency percentiles and error rates for each callback and overall
+def summarize(results, elapsed):
+	summary = {'elapsed_s': elapsed, 'requests': len(results),
+		'requests_per_s': len(results) / elapsed if elapsed else 0.0, 'callbacks': {}}
+	names = sorted(set(r[0] for r in results))
+	for name in names:
+		latencies = sorted(r[1] * 1000.0 for r in results if r[0] == name)
+		errors = sum(1 for r in results if r[0] == name and not r[2])
+		summary['callbacks'][name] = {
+			'count': len(latencies),
+			'errors': errors,
+			'error_rate': errors / float(len(latencies)),
+			'mean_ms': sum(latencies) / len(latencies),
+			'p50_ms': percentile(latencies, 50),
+			'p95_ms': percentile(latencies, 95),
+			'p99_ms': percentile(latencies, 99)
+		}
+	errors = sum(1 for r in results if not r[2])
+	summary['error_rate'] = errors / float(len(results)) if results else 0.0
+	return summary
+
+
+'''
+RUN LOAD TEST
+'''
+# Start the server unless a url is given, replay the sessions, and report
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--url', help='Test a running server instead of starting one')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--workers', type=int, default=2)
+	parser.add_argument('--clients', type=int, default=8)
+	parser.add_argument('--sessions', type=int, default=200)
+	parser.add_argument('--duration', type=float, help='Stop after this many seconds')
+	parser.add_argument('--recorded', help='Replay sessions from a SQLite storage file')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--max-error-rate', type=float, help='Fail above this error rate')
+	parser.add_argument('--json', action='store_true', help='Machine-readable output')
+	args = parser.parse_args()
+
+	# Recorded sessions, or synthetic ones from a fixed seed so builds compare
+	if args.recorded:
+		sessions = recorded_sessions(args.recorded)
+	else:
+		rng = random.Random(args.seed)
+		sessions = [synthetic_session(rng) for _ in range(args.sessions)]
+
+	# Start gunicorn with a throwaway storage file
+	server = None
+	storage_dir = None
+	url = args.url
+	if url is None:
+		storage_dir = tempfile.mkdtemp()
+		server = start_server(
+			args.port, args.workers, os.path.join(storage_dir, 'load_test.db'))
+		url = 'http://127.0.0.1:{}'.format(args.port)
+	try:
+		dependencies = wait_for_server(url)
+		callbacks = {}
+		for dependency in dependencies:
+			if dependency.get('clientside_function'):
+				continue  # Runs in the browser
+			first = dependency['output'].strip('.').split('...')[0]
+			if first in callback_names:
+				callbacks[callback_names[first]] = dependency
+		results, elapsed = run_clients(
+			url, callbacks, sessions, args.clients, args.duration)
+	finally:
+		if server is not None:
+			server.terminate()
+			server.wait()
+			shutil.rmtree(storage_dir, ignore_errors=True)
+	summary = summarize(results, elapsed)
+	summary.update({'clients': args.clients, 'workers': args.workers,
+		'sessions': len(sessions), 'recorded': bool(args.recorded)})
+
+	# Print the results
+	if args.json:
+		print(json.dumps(summary, indent=4, sort_keys=True))
+	else:
+		print('{} requests in {:.1f} s, {:.1f} requests/s, {:.2%} errors'.format(
+			summary['requests'], elapsed, summary['requests_per_s'], summary['error_rate']))
+		for name, c in sorted(summary['callbacks'].items()):
+			print('{:>10}  n={:<6} p50 {:>7.1f} ms  p95 {:>7.1f} ms  p99 {:>7.1f} ms  errors {:.2%}'.format(
+				name, c['count'], c['p50_ms'], c['p95_ms'], c['p99_ms'], c['error_rate']))
+
+	# Exit non-zero so a regression fails the build
+	if args.max_error_rate is not None and summary['error_rate'] > args.max_error_rate:
+		sys.exit('Error rate {:.2%} is over the {:.2%} limit'.format(
+			summary['error_rate'], args.max_error_rate))
\ No newline at end of file
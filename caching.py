@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+'''
+CACHES
+Shared by the Flask server and Dash apps for repeated work,
+in process and across the workers on a dyno
+'''
+# Import required packages for the caches
+from collections import OrderedDict
+from functools import wraps
+import json
+import sqlite3
+import threading
+import time
+
+# Import the per-process SQLite connections
+from models.process_local import SQLiteConnections
+
+
+# Sentinel so that None can be cached as a result
+_missing = object()
+
+
+'''
+BOUNDED LRU CACHE
+'''
+# Least recently used cache with an optional time to live for each entry
+class LRUCache(object):
+	def __init__(self, maxsize=128, ttl=None):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+
+	# Return the cached value, or the default if missing or expired
+	def get(self, key, default=None):
+		with self._lock:
+			try:
+				value, expires = self._data.pop(key)
+			except KeyError:
+				self.misses += 1
+				return default
+
+			# Expired entries count as a miss and are dropped
+			if expires is not None and expires < time.time():
+				self.misses += 1
+				return default
+
+			# Move the entry to the most recently used end
+			self._data[key] = (value, expires)
+			self.hits += 1
+			return value
+
+	# Add the value and evict the least recently used entries over maxsize
+	def set(self, key, value):
+		expires = time.time() + self.ttl if self.ttl else None
+		with self._lock:
+			self._data.pop(key, None)
+			self._data[key] = (value, expires)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	# Remove a single entry if it exists
+	def delete(self, key):
+		with self._lock:
+			self._data.pop(key, None)
+
+	# Remove every entry
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+
+	def __len__(self):
+		return len(self._data)
+
+	# Counters for monitoring the cache
+	def stats(self):
+		return {
+			'size': len(self._data),
+			'maxsize': self.maxsize,
+			'hits': self.hits,
+			'misses': self.misses
+		}
+
+
+'''
+SHARED SQLITE CACHE
+'''
+# Cache in a local SQLite file, shared by every worker on the dyno
+class SQLiteCache(object):
+	def __init__(self, path, ttl=None, table='cache'):
+		self.path = path
+		self.ttl = ttl
+		self.table = table
+		self.hits = 0
+		self.misses = 0
+		self._connections = SQLiteConnections(path, [
+			'CREATE TABLE IF NOT EXISTS {} '
+			'(key TEXT PRIMARY KEY, value TEXT, expires REAL)'.format(table),
+			'CREATE TABLE IF NOT EXISTS {}_leases '
+			'(key TEXT PRIMARY KEY, expires REAL)'.format(table)
+		])
+
+	# One connection per thread and process, in WAL mode for concurrent readers
+	def _connection(self):
+		return self._connections.get()
+
+	# Return the cached value, or the default if missing or expired
+	def get(self, key, default=None):
+		entry = self.get_entry(key)
+		if entry is None or (entry[1] is not None and entry[1] < time.time()):
+			self.misses += 1
+			return default
+		self.hits += 1
+		return entry[0]
+
+	# Return the value and expiry time, even if expired, or None if missing
+	def get_entry(self, key):
+		row = self._connection().execute(
+			'SELECT value, expires FROM {} WHERE key = ?'.format(self.table),
+			(key,)).fetchone()
+		return (json.loads(row[0]), row[1]) if row is not None else None
+
+	# Add the JSON encoded value, replacing any existing entry
+	def set(self, key, value, ttl=None):
+		ttl = ttl or self.ttl
+		expires = time.time() + ttl if ttl else None
+		self._connection().execute(
+			'INSERT OR REPLACE INTO {} (key, value, expires) VALUES (?, ?, ?)'.format(
+				self.table),
+			(key, json.dumps(value), expires))
+
+	# Remove a single entry if it exists
+	def delete(self, key):
+		self._connection().execute(
+			'DELETE FROM {} WHERE key = ?'.format(self.table), (key,))
+
+	# Take the lease on a key for some seconds, unless another process holds it
+	def acquire(self, key, seconds):
+		conn = self._connection()
+		now = time.time()
+		conn.execute(
+			'DELETE FROM {}_leases WHERE key = ? AND expires < ?'.format(self.table), (key, now))
+		cursor = conn.execute(
+			'INSERT OR IGNORE INTO {}_leases (key, expires) VALUES (?, ?)'.format(self.table),
+			(key, now + seconds))
+		return cursor.rowcount == 1
+
+	# Give up the lease on a key
+	def release(self, key):
+		self._connection().execute(
+			'DELETE FROM {}_leases WHERE key = ?'.format(self.table), (key,))
+
+	# Remove entries expired for longer than the grace seconds, or every entry
+	def clear(self, expired_only=False, grace=0):
+		if expired_only:
+			self._connection().execute(
+				'DELETE FROM {} WHERE expires < ?'.format(self.table), (time.time() - grace,))
+		else:
+			self._connection().execute('DELETE FROM {}'.format(self.table))
+
+	# Counters for monitoring the cache
+	def stats(self):
+		return {
+			'hits': self.hits,
+			'misses': self.misses
+		}
+
+
+'''
+SHARED CACHE TIER
+'''
+# Two tiers with versioned keys, where one worker at a time recomputes an entry
+class SharedCache(object):
+	def __init__(self, path, version='1', local_ttl=2, lease_seconds=30,
+			wait_seconds=10, stale_seconds=300):
+		self.store = SQLiteCache(path, table='shared')
+		self.local = LRUCache(maxsize=256, ttl=local_ttl)
+		self.version = version
+		self.lease_seconds = lease_seconds
+		self.wait_seconds = wait_seconds
+		self.stale_seconds = stale_seconds
+		self.computes = 0
+		self.stale = 0
+		self.waits = 0
+		self.errors = 0
+
+	# Key for a name, changing with the cache version and the entry's own version
+	def key(self, name, version=''):
+		return '{}:{}:{}'.format(self.version, version, name)
+
+	# Return the entry from the first tier that has it fresh, recomputing it at most once
+	def get_or_compute(self, name, compute, ttl=None, version=''):
+		key = self.key(name, version)
+		value = self.local.get(key, _missing)
+		if value is not _missing:
+			return value
+
+		# A fresh shared entry was computed by this or another worker
+		entry = self._shared(None, self.store.get_entry, key)
+		now = time.time()
+		if entry is not None and (entry[1] is None or entry[1] >= now):
+			self.local.set(key, entry[0])
+			return entry[0]
+
+		# Only the lease holder recomputes, while the others serve the stale entry
+		leased = self._shared(None, self.store.acquire, key, self.lease_seconds)
+		if leased is False:
+			if entry is not None and entry[1] + self.stale_seconds >= now:
+				self.stale += 1
+				return entry[0]
+			value = self._wait(key)
+			if value is not _missing:
+				self.local.set(key, value)
+				return value
+
+		# Compute and share the entry, giving up the lease only if this worker holds it
+		try:
+			value = compute()
+			self.computes += 1
+			self._shared(None, self.store.set, key, value, ttl)
+		finally:
+			if leased:
+				self._shared(None, self.store.release, key)
+		if self.computes % 100 == 0:
+			self._shared(None, self.store.clear, True, self.stale_seconds)
+		self.local.set(key, value)
+		return value
+
+	# Poll for the lease holder's entry, giving up after wait_seconds
+	def _wait(self, key):
+		self.waits += 1
+		deadline = time.time() + self.wait_seconds
+		while time.time() < deadline:
+			time.sleep(0.05)
+			value = self._shared(_missing, self.store.get, key, _missing)
+			if value is not _missing:
+				return value
+		return _missing
+
+	# Run a shared tier call, returning the default if the file fails so the worker computes its own
+	def _shared(self, default, method, *args):
+		try:
+			return method(*args)
+		except sqlite3.Error:
+			self.errors += 1
+			return default
+
+	# Counters for monitoring the cache
+	def stats(self):
+		return {
+			'local': self.local.stats(),
+			'shared': self.store.stats(),
+			'computes': self.computes,
+			'stale': self.stale,
+			'waits': self.waits,
+			'errors': self.errors
+		}
+
+
+'''
+MEMOIZATION
+'''
+# Decorator caching a function's result on its hashable positional args
+def memoize(cache):
+	def decorator(func):
+		@wraps(func)
+		def wrapper(*args):
+			value = cache.get(args, _missing)
+			if value is _missing:
+				value = func(*args)
+				cache.set(args, value)
+			return value
+
+		# Expose the cache for stats and invalidation
+		wrapper.cache = cache
+		return wrapper
+	return decorator
@@ -0,0 +1,123 @@
+/*
+CLIENTSIDE CALLBACKS
+The text input sync and the income outputs run in the browser,
+using the constants from the clientside-config store
+*/
+(function() {
+
+	// Round to a number of decimal places, as Python's round does
+	function round(value, places) {
+		var factor = Math.pow(10, places);
+		return Math.round(value * factor) / factor;
+	}
+
+	// Format a number of dollars with commas and no cents
+	function dollars(value) {
+		return '$' + Math.round(value).toLocaleString('en-US');
+	}
+
+	// Build a Dash component for a callback output
+	function component(namespace, type, props) {
+		return {namespace: namespace, type: type, props: props};
+	}
+
+	// Calculate the total tax charged, given an AGI
+	function calculateTax(agi, taxes, brackets) {
+		var tax = 0;
+		for (var i = 0; i < brackets.length; i++) {
+			if (brackets[i][0] < agi) {
+				tax += (Math.min(brackets[i][1], agi) - brackets[i][0]) * taxes[i];
+			}
+		}
+		return tax;
+	}
+
+	// Collect the slider values passed between the income and the config
+	function rates(args) {
+		return Array.prototype.slice.call(args, 1, args.length - 1);
+	}
+
+	window.dash_clientside = Object.assign({}, window.dash_clientside, {
+		tax_input: {
+
+			// Replace the text input when the slider changes. Dash 0.41 has no clientside
+			// PreventUpdate, and doesn't fire callbacks for the replaced input, so when the
+			// values already match the input is rebuilt with the value the user typed
+			input_from_slider: function(sliderValue, stateId, inputValue) {
+				var matches = inputValue !== null && inputValue !== undefined &&
+					round(inputValue / 100.0, 4) === round(sliderValue, 4);
+				return component('dash_core_components', 'Input', {
+					id: 'input-text-' + stateId.split('-').pop(),
+					min: 0,
+					max: 100,
+					value: matches ? inputValue : round(sliderValue * 100.0, 2),  // 2 decimal places
+					type: 'number'
+				});
+			},
+
+			// Display the total tax for this AGI using IL flat tax
+			old_tax: function(agi, config) {
+				var oldTax = calculateTax(agi, config.flat_rates, config.brackets);
+				return component('dash_html_components', 'H4', {children: dollars(oldTax)});
+			},
+
+			// Display the total tax for this AGI
+			new_tax: function(agi) {
+				var config = arguments[arguments.length - 1];
+				var newTax = calculateTax(agi, rates(arguments), config.brackets);
+				return component('dash_html_components', 'H4', {children: dollars(newTax)});
+			},
+
+			// Subtract old tax from the new tax
+			tax_difference: function(agi) {
+				var config = arguments[arguments.length - 1];
+				var diff = calculateTax(agi, rates(arguments), config.brackets) -
+					calculateTax(agi, config.flat_rates, config.brackets);
+
+				// Return the data formatted with dollar sign and indicator
+				if (diff > 0) {
+					return component('dash_html_components', 'H4',
+						{children: '+' + dollars(Math.abs(diff)), style: {color: config.red}});
+				} else if (diff === 0) {
+					return component('dash_html_components', 'H4', {children: dollars(0)});
+				}
+				return component('dash_html_components', 'H4',
+					{children: '-' + dollars(Math.abs(diff)), style: {color: config.green}});
+			},
+
+			// Horizontal stacked bar showing how the tax is applied to the AGI
+			tax_graph: function(agi) {
+				var config = arguments[arguments.length - 1];
+				var taxes = rates(arguments);
+				agi = agi || 0;
+
+				// Put the income into its brackets using the figure template
+				var data = [];
+				for (var i = 0; i < config.brackets.length; i++) {
+					var b = config.brackets[i];
+					if (b[0] < agi) {
+						data.push({
+							type: 'bar',
+							x: [Math.min(b[1], agi) - b[0]],
+							y: [agi],
+							name: config.labels[i],
+							text: round(taxes[i] * 100.0, 2).toFixed(2) + '%',
+							textposition: 'auto',
+							hoverinfo: 'name',
+							orientation: 'h',
+							hoverlabel: config.styles[i][0],
+							marker: config.styles[i][1]
+						});
+					}
+				}
+
+				// Patch the title and range into the template
+				var layout = Object.assign({}, config.example_layout);
+				layout.title = Object.assign({}, config.example_title,
+					{text: 'Income Tax Rates<br>for ' + dollars(agi)});
+				layout.xaxis = Object.assign({}, config.example_xaxis, {range: [0, agi]});
+				return {data: data, layout: layout};
+			}
+		}
+	});
+})();
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+'''
+FIGURE TEMPLATES
+Static layouts, labels, and colors are built once at import,
+and each call only fills in the data as plain dictionaries
+'''
+# Import packages for cleaning labels
+import re
+import sys
+
+# Import styles that apply to all Dash apps
+from styling import *
+
+# Import from app file in parent directory
+sys.path.append('..')
+from tax_engine import brackets, x
+
+
+'''
+LABELS AND STYLES
+'''
+# Shorten bracket labels for the graphs, e.g. $25,001-$50,000 to $25k-$50k
+def short_label(label):
+	return re.sub(',00[0|1]', 'k', label)
+
+# Labels for the IL brackets are only relabelled once
+bracket_labels = x
+short_labels = [short_label(b) for b in x]
+font_style = {'family': font}
+
+# Hover labels and markers for each color in a list of colors
+def color_styles(colors):
+	return [
+		(
+			{'bgcolor': c, 'font': font_style},
+			{'color': c}
+		)
+		for c in colors
+	]
+
+# Cache the styles for each list of colors used by the graphs
+styles_by_colors = {}
+def styles_for(colors):
+	key = tuple(colors)
+	if key not in styles_by_colors:
+		styles_by_colors[key] = color_styles(colors)
+	return styles_by_colors[key]
+
+
+'''
+TAX RATE BAR CHART
+'''
+# Static trace properties and layout for the tax rate bars
+rate_bar_trace = {
+	'x': short_labels,
+	'type': 'bar',
+	'hoverinfo': 'y',
+	'marker': {
+		'color': colors
+	}
+}
+rate_bar_yaxis = {
+	'title': 'Tax Rate for Bracket',
+	'titlefont': font_style,
+	'ticksuffix': '%'
+}
+rate_bar_layout = {
+	'titlefont': font_style,
+	'xaxis': {
+		'title': 'Income Bracket',
+		'titlefont': font_style
+	},
+	'showlegend': False
+}
+
+# Function for returning bar graph of rates
+def tax_rate_bar(tax_rates, title):
+	rates = [round(tax_rates[v] * 100.0, 2) for v in x]
+
+	# Range is 17.5% unless one of the graphs exceeds it
+	ymax = max(max(rates), 17.5)
+
+	# Patch the data and title into the template
+	layout = dict(rate_bar_layout, title=title)
+	layout['yaxis'] = dict(rate_bar_yaxis, range=[0, ymax])
+	return {
+		'data': [dict(rate_bar_trace, y=rates)],
+		'layout': layout
+	}
+
+
+# Bars of the median rates, with error bars from the 25th to the 75th percentile
+def rate_quantile_bar(lower, median, upper, title):
+	figure = tax_rate_bar(dict(zip(x, median.tolist())), title)
+	figure['data'][0]['error_y'] = {
+		'type': 'data',
+		'symmetric': False,
+		'array': ((upper - median) * 100.0).round(2).tolist(),
+		'arrayminus': ((median - lower) * 100.0).round(2).tolist(),
+		'color': 'grey'
+	}
+	figure['layout']['yaxis']['range'] = [0, max(float(upper.max()) * 100.0, 17.5)]
+	return figure
+
+'''
+FLAT AND PROGRESSIVE EXAMPLE BARS
+'''
+# Static layout for the horizontal example bars
+example_bar_title = {
+	'yanchor': 'top',
+	'xanchor': 'center',
+	'y': 0.7,
+	'x': 0.5
+}
+example_bar_xaxis = {
+	'showgrid': False,
+	'zeroline': False,
+	'showline': False,
+	'ticks': '',
+	'showticklabels': True,
+	'tickprefix': '$'
+}
+example_bar_layout = {
+	'barmode': 'stack',
+	'titlefont': font_style,
+	'showlegend': False,
+	'height': 220,
+	'margin': {
+		'l': 50,
+		'r': 50,
+		'pad': 0
+	},
+	'yaxis': {
+		'showgrid': False,
+		'zeroline': False,
+		'showline': False,
+		'ticks': '',
+		'showticklabels': False
+	}
+}
+
+# Show a single bar demonstrating how a tax is applied to an income
+def example_bar_graphs(
+		values,
+		brackets=brackets,
+		x=x,
+		title='Income Tax Rates<br>for ${:,.0f}',
+		colors=colors
+	):
+	agi = values[0]
+	taxes = values[1:]
+	styles = styles_for(colors)
+
+	# Put the income into its brackets
+	income_brackets = []
+	for i, b in enumerate(brackets):
+		if b[0] < agi:
+
+			# Calculate how much tax will be paid
+			amt = min(b[1], agi) - b[0]
+			tax = amt * taxes[i]
+
+			# If x is supplied, use the tag as the hoverinfo
+			if x:
+				name = short_labels[i] if x is bracket_labels else short_label(x[i])
+
+			# Otherwise, use the amount of tax paid
+			else:
+				name = '${:,.0f}'.format(tax)
+
+			# Add the trace for the bar chart
+			hoverlabel, marker = styles[i]
+			income_brackets.append({
+				'type': 'bar',
+				'x': [amt],
+				'y': [agi],
+				'name': name,
+				'text': '{:,.2f}%'.format(taxes[i] * 100.0),
+				'textposition': 'auto',
+				'hoverinfo': 'name',
+				'orientation': 'h',
+				'hoverlabel': hoverlabel,
+				'marker': marker
+			})
+
+	# Patch the title and range into the template
+	layout = dict(example_bar_layout)
+	layout['title'] = dict(example_bar_title, text=title.format(agi))
+	layout['xaxis'] = dict(example_bar_xaxis, range=[0, agi])
+	return {
+		'data': income_brackets,
+		'layout': layout
+	}
+
+
+'''
+REVENUE BAR CHART AND PIE
+'''
+# Static trace properties for each band in the stacked revenue bars
+revenue_bar_traces = [
+	{
+		'type': 'bar',
+		'name': band,
+		'text': short_labels[c],
+		'hoverinfo': 'text',
+		'hoverlabel': styles_for(colors)[c][0],
+		'marker': styles_for(colors)[c][1]
+	}
+	for c, band in enumerate(x)
+]
+revenue_bar_layout = {
+	'barmode': 'stack',
+	'title': 'IL Tax Revenue<br>Distributed by Income Bracket',
+	'titlefont': font_style,
+	'yaxis': {
+		'title': 'Total Income Tax Revenue',
+		'titlefont': font_style,
+		'tickprefix': '$'
+	},
+	'showlegend': False
+}
+
+# Stacked bar chart of revenue from each band in each AGI range
+def revenue_bar(rev_matrix):
+	rev_data = []
+	for c, trace in enumerate(revenue_bar_traces):
+		y = rev_matrix[:, c].tolist()
+		rev_data.append(dict(
+			trace,
+			x=[j for i, j in enumerate(short_labels) if y[i]],
+			y=[j for j in y if j]
+		))
+	return {
+		'data': rev_data,
+		'layout': revenue_bar_layout
+	}
+
+# Static trace properties and layout for the revenue pie
+revenue_pie_trace = {
+	'type': 'pie',
+	'labels': short_labels,
+	'textinfo': 'label+percent',
+	'marker': {'colors': colors},
+	'hoverinfo': 'text',
+	'hoverlabel': {'font': font_style}
+}
+revenue_pie_layout = {
+	'title': 'Percentage of IL Tax Revenue<br>by Income Bracket',
+	'titlefont': font_style,
+	'showlegend': False
+}
+
+# Pie chart of the revenue from each AGI range
+def revenue_pie(y):
+	return {
+		'data': [dict(
+			revenue_pie_trace,
+			text=['${:,.0f}'.format(v) for v in y],
+			values=y
+		)],
+		'layout': revenue_pie_layout
+	}
+
+
+'''
+SESSION TRAJECTORY LINES
+'''
+# Static trace properties for each bracket's mean rate and the distance from the submit
+trajectory_traces = [
+	{
+		'type': 'scatter',
+		'mode': 'lines',
+		'name': short_labels[c],
+		'hoverlabel': styles_for(colors)[c][0],
+		'line': {'color': colors[c]}
+	}
+	for c, band in enumerate(x)
+]
+trajectory_distance_trace = {
+	'type': 'scatter',
+	'mode': 'lines',
+	'name': 'Distance from Submit',
+	'yaxis': 'y2',
+	'line': {'color': 'grey', 'dash': 'dot'}
+}
+trajectory_layout = {
+	'titlefont': font_style,
+	'xaxis': {
+		'title': 'Minutes into Session',
+		'titlefont': font_style
+	},
+	'yaxis': {
+		'title': 'Average Tax Rate',
+		'titlefont': font_style,
+		'ticksuffix': '%'
+	},
+	'yaxis2': {
+		'title': 'Distance from Submit',
+		'titlefont': font_style,
+		'ticksuffix': '%',
+		'overlaying': 'y',
+		'side': 'right',
+		'showgrid': False
+	},
+	'legend': {'orientation': 'h', 'font': font_style}
+}
+
+# Lines of the average rates over time and how far they were from the submitted rates
+def trajectory_lines(summary, title):
+	minutes = summary['minutes'].round(2).tolist()
+	rates = (summary['mean_rates'] * 100.0).round(2)
+	data = [
+		dict(trace, x=minutes, y=rates[:, c].tolist())
+		for c, trace in enumerate(trajectory_traces)
+	]
+	data.append(dict(
+		trajectory_distance_trace,
+		x=minutes,
+		y=(summary['distance'] * 100.0).round(3).tolist()
+	))
+	return {
+		'data': data,
+		'layout': dict(trajectory_layout, title=title)
+	}
\ No newline at end of file
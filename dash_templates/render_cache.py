@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+'''
+RENDER CACHE
+Invariant figures and layout subtrees are rendered once,
+with their JSON pre-encoded for serving the layouts
+'''
+# Import packages for encoding and serving the layouts
+import flask
+import hashlib
+import os
+import sys
+import threading
+
+# Import the compact encoding shared with the callback responses
+from responses import to_json
+
+# Import from app file in parent directory
+sys.path.append('..')
+from agi_data import csv_path
+from server import shared_cache
+
+
+'''
+CACHE
+'''
+# The rendered figures depend on the AGI data and the styles
+styling_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'styling.py')
+watched_files = [csv_path, styling_path]
+
+# Encode the same way as the callback responses
+def encode(value):
+	return to_json(value)
+
+# Render each named builder once per version of the watched files
+class RenderCache(object):
+	def __init__(self, watched_files, shared=None):
+		self.watched_files = watched_files
+		self.shared = shared
+		self._values = {}
+		self._encoded = {}
+		self._version = None
+		self._lock = threading.RLock()  # Layout builders get the cached figures
+
+	# Modification time and size of every watched file
+	def version(self):
+		return tuple(
+			(os.path.getmtime(p), os.path.getsize(p)) for p in self.watched_files)
+
+	# Short text for the version, the same in every worker, for the shared keys
+	def version_key(self):
+		return hashlib.md5(repr(self.version()).encode('utf-8')).hexdigest()[:12]
+
+	# Drop every entry when the watched files change
+	def _check_version(self):
+		version = self.version()
+		if version != self._version:
+			self._values = {}
+			self._encoded = {}
+			self._version = version
+
+	# Rendered object, for embedding in a layout
+	def get(self, name, builder):
+		with self._lock:
+			self._check_version()
+			if name not in self._values:
+				self._values[name] = builder()
+			return self._values[name]
+
+	# Pre-encoded JSON, for serving directly, rendered by one worker when shared
+	def encoded(self, name, builder):
+		with self._lock:
+			self._check_version()
+			if name not in self._encoded:
+				if self.shared is None:
+					self._encoded[name] = encode(builder())
+				else:
+					self._encoded[name] = self.shared.get_or_compute(
+						'render:{}'.format(name), lambda: encode(builder()),
+						version=self.version_key())
+			return self._encoded[name]
+
+	# Remove every entry
+	def clear(self):
+		with self._lock:
+			self._values = {}
+			self._encoded = {}
+
+# Cache shared by both Dash apps, and with the other workers through the shared tier
+render_cache = RenderCache(watched_files, shared_cache)
+
+
+'''
+LAYOUT SERVING
+'''
+# Serve a Dash app's layout from its pre-encoded JSON, filling in placeholders
+def serve_cached_layout(dash_app, name, builder, fills={}):
+
+	# Replace each placeholder with the text from its function for this request
+	def serve_layout():
+		encoded = render_cache.encoded(name, builder)
+		for placeholder, fill in fills.items():
+			encoded = encoded.replace(placeholder, fill())
+		return flask.Response(encoded, mimetype='application/json')
+
+	# Replace the view Dash registered for the layout route
+	endpoint = '{}_dash-layout'.format(dash_app.config['routes_pathname_prefix'])
+	dash_app.server.view_functions[endpoint] = serve_layout
+	return serve_layout
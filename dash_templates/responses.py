@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+'''
+CALLBACK RESPONSES
+Compact JSON for the layouts and callback responses,
+without the extra round trip in plotly's encoder
+'''
+# Import packages for encoding the responses
+from collections import defaultdict
+from decimal import Decimal
+from functools import wraps
+import json
+
+import dash
+from dash.exceptions import PreventUpdate
+
+
+'''
+ENCODING
+'''
+# Convert what json can't encode natively, as plotly's encoder would
+def plain(o):
+	if hasattr(o, 'to_plotly_json'):
+		return o.to_plotly_json()  # Dash components
+	if isinstance(o, Decimal):
+		return float(o)
+	if hasattr(o, 'tolist'):
+		return o.tolist()  # NumPy arrays and scalars
+	raise TypeError('{} is not JSON serializable'.format(repr(o)))
+
+# Encode in one pass without whitespace, falling back to plotly for NaN and Inf
+def to_json(value):
+	try:
+		return json.dumps(value, default=plain, separators=(',', ':'), allow_nan=False)
+	except ValueError:
+		import plotly
+		return json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+'''
+CALLBACKS
+'''
+# Register a callback with Dash, then answer its requests with the compact encoding
+def compact_callback(dash_app, output, inputs=[], state=[]):
+	multi = isinstance(output, (list, tuple))
+
+	def decorator(func):
+		registered = dash_app.callback(output, inputs, state)(func)
+
+		# Same response format as Dash, including no_update for skipped outputs
+		@wraps(func)
+		def respond(*args):
+			value = func(*args)
+			if multi:
+				props = defaultdict(dict)
+				for o, v in zip(output, value):
+					if v is not dash.no_update:
+						props[o.component_id][o.component_property] = v
+				if not props:
+					raise PreventUpdate()
+				return to_json({'response': props, 'multi': True})
+			if value is dash.no_update:
+				raise PreventUpdate()
+			return to_json({'response': {'props': {output.component_property: value}}})
+
+		# Replace the response Dash built for the callback
+		for entry in dash_app.callback_map.values():
+			if entry.get('callback') is registered:
+				entry['callback'] = respond
+		return func
+	return decorator
\ No newline at end of file
@@ -6,15 +6,13 @@ INITIALIZE DASH APP
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-import plotly.graph_objs as go
 from textwrap import dedent
 
 # Import packages for data retrieval, post, and cleaning
 from datetime import datetime
-from flask import request
+from flask import jsonify, request
+import json
 import os
-import pandas as pd
-import re
 import sys
 import uuid
 
@@ -25,27 +23,43 @@ from styling import *
 sys.path.append('..')
 from server import (
 	app as server,
-	send_kvs_data
+	send_kvs_data,
+	shared_cache
 )
+from caching import LRUCache, memoize
+from metrics import instrument_callbacks
+from tax_engine import (
+	bracket_revenue,
+	brackets,
+	flat_rates,
+	revenue_matrix,
+	x
+)
+
+# Import the figure templates and the cache for invariant renders
+from figures import (
+	example_bar_graphs,
+	example_bar_layout,
+	example_bar_title,
+	example_bar_xaxis,
+	revenue_bar,
+	revenue_pie,
+	short_labels,
+	styles_for
+)
+from render_cache import render_cache, serve_cached_layout
+from responses import compact_callback, to_json
 
 # Initialize the dash app with Flask app as server on index
 dash_app_input = dash.Dash(
 	__name__, 
 	external_stylesheets=external_stylesheets, 
 	server=server,
-	url_base_pathname='/'
+	url_base_pathname='/',
+	compress=False  # The server compresses every response
 )
 
 
-'''
-DATA FROM CSV
-'''
-# Open the data from csv and get the x-axis values
-csv_path = os.path.join(server.static_folder, 'data', 'agi_data.csv')
-df = pd.read_csv(csv_path, index_col=0)
-x = df.index.tolist()  # x-axis on most graphs
-
-
 '''
 SLIDERS
 '''
@@ -93,6 +107,9 @@ tax_dict = [
 	}
 ]
 
+# Marks every 10% on the sliders
+slider_marks = {m / 100.0: '{}%'.format(m) for m in range(0, 101, 10)}
+
 # Dropdown edits the values of the sliders
 def create_dropdown(default='IL_2017'):
 
@@ -169,15 +186,6 @@ def create_sliders(values=[0.0495] * 5, default='IL_2017'):
 '''
 FLAT AND PROGRESSIVE EXAMPLE BARS
 '''
-# IL Brackets used for tax calc and graph calc
-brackets = [
-	[0, 25000],
-	[25000, 50000],
-	[50000, 100000],
-	[100000, 500000],
-	[500000, 1000000000000]  # Trillion is the max input
-]
-
 # Fed brackets and rates used in the progressive example graph
 fed_brackets = [
 	[0, 9525],
@@ -187,91 +195,22 @@ fed_brackets = [
 ]
 fed_rates = [0.1, 0.12, 0.22, 0.24]
 
-# Show a single bar demonstrating how a tax is applied to an income
-def example_bar_graphs(
-		values,
-		brackets=brackets,
-		x=x,
-		title='Income Tax Rates<br>for ${:,.0f}',
-		colors=colors
-	):
-	agi = values[0]
-	taxes = values[1:]
-
-	# Put the income into its brackets
-	income_brackets = []
-	for i, b in enumerate(brackets):
-		if b[0] < agi:
-
-			# Calculate how much tax will be paid
-			amt = min(b[1], agi) - b[0]
-			tax = amt * taxes[i]
-
-			# If x is supplied, use the tag as the hoverinfo
-			if x:
-				name = re.sub(',00[0|1]', 'k', x[i])
-				hoverinfo = 'name'
-			
-			# Otherwise, use the amount of tax paid
-			else:
-				name = '${:,.0f}'.format(tax)
-				hoverinfo = 'name'
-
-			# Add the trace for the bar chart
-			trace = go.Bar(
-				x=[amt],
-				y=[agi],
-				name=name,
-				text='{:,.2f}%'.format(taxes[i] * 100.0),
-				textposition='auto',
-				hoverinfo=hoverinfo,
-				orientation='h',
-				hoverlabel={
-					'bgcolor': colors[i],
-					'font': {'family': font}
-				},
-				marker={'color': colors[i]}
-			)
-			income_brackets.append(trace)
-
-	# Return the figure to the graph
-	return go.Figure(
-		data=income_brackets,
-		layout=go.Layout(
-			barmode='stack',
-			title={
-				'text': title.format(agi),
-				'yanchor': 'top',
-				'xanchor': 'center',
-				'y': 0.7,
-				'x': 0.5
-			},
-			titlefont={'family': font},
-			showlegend=False,
-			height=220,
-			margin={
-				'l': 50,
-				'r': 50,
-				'pad': 0
-			},
-			yaxis={
-				'showgrid': False,
-				'zeroline': False,
-				'showline': False,
-				'ticks': '',
-				'showticklabels': False
-			},
-			xaxis={
-				'showgrid': False,
-				'zeroline': False,
-				'showline': False,
-				'ticks': '',
-				'showticklabels': True,
-				'tickprefix': '$',
-				'range': [0, agi]
-			}
-		)
-	)
+
+'''
+CLIENTSIDE CONSTANTS
+'''
+# Constants for the callbacks in assets/tax_input.js, served in a store
+clientside_config = {
+	'brackets': brackets,
+	'flat_rates': flat_rates,
+	'labels': short_labels,
+	'styles': styles_for(colors),
+	'green': green,
+	'red': red,
+	'example_layout': example_bar_layout,
+	'example_title': example_bar_title,
+	'example_xaxis': example_bar_xaxis
+}
 
 
 '''
@@ -367,8 +306,8 @@ def create_info():
 LAYOUT
 '''
 # Provide the layout of the app in a function with session_id
-def serve_layout():
-	session_id = str(uuid.uuid4())
+def serve_layout(session_id=None):
+	session_id = session_id or str(uuid.uuid4())
 	return html.Div(children=[
 
 		# Title for introductory section
@@ -380,7 +319,7 @@ def serve_layout():
 
 		# Explanatory text
 		html.Div(children=[
-			html.Div(children=create_info(), 
+			html.Div(children=render_cache.get('input-info', create_info), 
 				className='col-md-12 text-justify')
 		], className='row'),
 		
@@ -483,6 +422,9 @@ def serve_layout():
 		# Hidden div for session id
 		html.Div(session_id, id='session-id', style={'display': 'none'}),
 
+		# Constants for the clientside callbacks
+		dcc.Store(id='clientside-config', data=clientside_config),
+
 	# Close out the container with 100% of the frame width
 	], style={'width': '100%', 'padding-left': '3.75%', 'padding-right': '3.75%'})
 
@@ -490,12 +432,22 @@ def serve_layout():
 dash_app_input.layout = serve_layout
 dash_app_input.title = 'IL Income Tax Customization'
 
+# Only the session id varies, so serve the pre-encoded layout with a new one
+session_placeholder = '__SESSION_ID__'
+serve_cached_layout(
+	dash_app_input,
+	'input-layout',
+	lambda: serve_layout(session_placeholder),
+	{session_placeholder: lambda: str(uuid.uuid4())}
+)
+
 
 '''
 SUBMIT BUTTON CALLBACK
 '''
 # State includes slider values and session_id for kvs
-@dash_app_input.callback(
+@compact_callback(
+	dash_app_input,
 	dash.dependencies.Output('session-id', 'children'),
 	[dash.dependencies.Input('results-btn', 'n_clicks')],
 	[dash.dependencies.State('slider-{}'.format(j), 'value') for j, b in enumerate(x)] +
@@ -537,172 +489,58 @@ def results_callback(*values):
 
 
 '''
-CALLBACK FOR SLIDER AND INPUT
+CALLBACKS FOR SLIDER AND INPUT
 '''
-# Callback for changing value of specific slider
+# The text input replaces its slider on the server, since Dash 0.41 only fires the
+# callbacks of a replaced slider's value for server responses, and has no clientside PreventUpdate
 for i, band in enumerate(x):
-	@dash_app_input.callback(
+	@compact_callback(
+		dash_app_input,
 		dash.dependencies.Output('slider-section-{}'.format(i), 'children'),
 		[dash.dependencies.Input('input-text-{}'.format(i), 'value')],
 		[dash.dependencies.State('input-text-{}'.format(i), 'id'),
 		dash.dependencies.State('slider-{}'.format(i), 'value')]
 	)
-	def slider_callback(input_value, state_id, slider_value):
-		if round(input_value / 100.0, 4) != round(slider_value, 4):
-			return dcc.Slider(
-				id='slider-{}'.format(state_id.split('-')[-1]),
-				min=0,
-				max=1,
-				marks={m / 100.0: '{}%'.format(m) for m in range(0, 101, 10)},
-				value=round(input_value / 100.0, 4), # Percentage, so 4 decimal places
-				step=0.0005
-			)
-
-		# If the values are the same, prevent a callback infinite loop
-		else:
+	def slider_from_input(input_value, state_id, slider_value):
+
+		# If the input is empty or the values are the same, prevent a callback infinite loop
+		if input_value is None or round(input_value / 100.0, 4) == round(slider_value, 4):
 			raise dash.exceptions.PreventUpdate()
+		return dcc.Slider(
+			id='slider-{}'.format(state_id.split('-')[-1]),
+			min=0,
+			max=1,
+			marks=slider_marks,
+			value=round(input_value / 100.0, 4),  # Percentage, so 4 decimal places
+			step=0.0005
+		)
 
-# Callback for changing text of specific input
+# The slider replaces its text input in the browser, without server requests
 for i, band in enumerate(x):
-	@dash_app_input.callback(
+	dash_app_input.clientside_callback(
+		dash.dependencies.ClientsideFunction('tax_input', 'input_from_slider'),
 		dash.dependencies.Output('input-section-{}'.format(i), 'children'),
 		[dash.dependencies.Input('slider-{}'.format(i), 'value')],
 		[dash.dependencies.State('slider-{}'.format(i), 'id'),
 		dash.dependencies.State('input-text-{}'.format(i), 'value')]
 	)
-	def input_callback(slider_value, state_id, input_value):
-		if round(input_value / 100.0, 4) != round(slider_value, 4):
-			return dcc.Input(
-				id='input-text-{}'.format(state_id.split('-')[-1]), 
-				min=0,
-				max=100,
-				value=round(slider_value * 100.0, 2),  # 2 decimal places
-				type='number'
-			)
-		
-		# If the values are the same, prevent a callback infinite loop
-		else:
-			raise dash.exceptions.PreventUpdate()
-
-
-'''
-SLIDER CALLBACK FOR REVENUE BAR CHART
-'''
-# Callback for tax revenue graph 
-values = ['value{}'.format(i) for i in range(len(x))]
-@dash_app_input.callback(
-	dash.dependencies.Output('tax-revenue-bar', 'figure'),
-	[dash.dependencies.Input('slider-{}'.format(j), 'value') for j, b in enumerate(x)],
-	[dash.dependencies.State('session-id', 'children')] +
-	[dash.dependencies.State('input-agi-calc', 'value')]
-)
-
-# Create the graph and send the data to the kvs store function
-def graph_callback(*values):
-	income = values[-1]
-	session_id = values[-2]
-	values = values[:-2]
-
-	# Make a copy of the dataframe and apply each rate
-	rev_df = df.copy(deep=True)
-	for i, band in enumerate(x):
-		rev_df[band] = rev_df[band].apply(lambda x: x * values[i])
-	
-	# Iterate to get the y for the graph
-	rev_data = []
-	for c, band in enumerate(x):  
-		y = [round(i, -7) for i in rev_df[band].tolist()]
-		rev_data.append(
-			go.Bar(
-				x=[re.sub(',00[0|1]', 'k', j) for i, j in enumerate(x) if y[i]],
-				y=[j for j in y if j],
-				name=band,
-				text=re.sub(',00[0|1]', 'k', band),
-				hoverinfo='text',
-				hoverlabel={
-					'bgcolor': colors[c],
-					'font': {'family': font}
-				},
-				marker={'color': colors[c]}
-			)
-		)
-
-	# If on Heroku, use forwarded IP
-	if 'ON_HEROKU' not in os.environ:
-		ip = request.remote_addr
-	else:
-		ip = request.headers['X-Forwarded-For']
-
-	# Send data about graph change to kvs
-	slider_pos = {k:v for k,v in zip(x, values)}
-	kvs_data = {
-		'session_id': session_id,
-		'timestamp': datetime.now().isoformat(),
-		'request_ip': ip,
-		'tax_rates': slider_pos,
-		'income': income
-	}
-	send_kvs_data(kvs_data)
-
-	# Return the new tax revenue
-	return go.Figure(
-		data=rev_data,
-		layout=go.Layout(
-			barmode='stack',
-			title='IL Tax Revenue<br>Distributed by Income Bracket',
-			titlefont={'family': font},
-			yaxis={
-				'title':'Total Income Tax Revenue',
-				'titlefont': {'family': font},
-				'tickprefix': '$'
-			},
-			showlegend=False
-		)
-	)
 
 
 '''
-CALLBACK FOR TOTAL REVENUE COLLECTED
+REVENUE OUTPUTS FROM SLIDERS
 '''
-# Calculate the taxes collected
-@dash_app_input.callback(
-	dash.dependencies.Output('total-collected', 'children'),
-	[dash.dependencies.Input('slider-{}'.format(j), 'value') for j, b in enumerate(x)]
-)
-
-# Apply each rate and sum
-def collection_callback(*values):
-	rev_df = df.copy(deep=True)
-	for i, band in enumerate(x):
-		rev_df[band] = rev_df[band].apply(lambda x: x * values[i])
-
-	# Use the row indices for the actual data
-	y = []
-	for band in x:
-		y.append(round(rev_df.loc[band].sum()))
+# Revenue current flat tax collects, the baseline for the differences
+baseline_revenue = 17158013217
 
-	# Return the data
-	return html.H5('${:,.0f}'.format(round(sum(y))))
-
-# Calculate the difference for the taxes collected
-@dash_app_input.callback(
-	dash.dependencies.Output('collected-difference', 'children'),
-	[dash.dependencies.Input('slider-{}'.format(j), 'value') for j, b in enumerate(x)]
-)
-
-# Get the difference between the total revenue collected
-def collection_difference_callback(*values):
-	rev_df = df.copy(deep=True)
-	for i, band in enumerate(x):
-		rev_df[band] = rev_df[band].apply(lambda x: x * values[i])
+# Total revenue collected
+def collection_total(total):
+	return html.H5('${:,.0f}'.format(total))
 
-	# Use the row indices for the actual data
-	new = 0
-	for band in x:
-		new += round(rev_df.loc[band].sum())
+# Difference from the revenue collected by the current flat tax
+def collection_difference(total):
 
 	# Get the difference by subtracting the old amount
-	diff = new - 17158013217
+	diff = total - baseline_revenue
 
 	# Return the data formatted with dollar sign and indicator
 	if diff > 0:
@@ -712,156 +550,174 @@ def collection_difference_callback(*values):
 	else:
 		return html.H5('-${:,.0f}'.format(abs(diff)), style={'color': red})
 
-
-'''
-SLIDER CALLBACK FOR REVENUE PIE 
-'''
-# Callback is similar to bar
-@dash_app_input.callback(
-	dash.dependencies.Output('tax-revenue-pie', 'figure'),
-	[dash.dependencies.Input('slider-{}'.format(j), 'value') for j, b in enumerate(x)]
-)
-
-# Apply each rate to the copy of the dataframe 
-def pie_callback(*values):
-	rev_df = df.copy(deep=True)
-	for i, band in enumerate(x):
-		rev_df[band] = rev_df[band].apply(lambda x: x * values[i])
-
-	# Use the row indices for the actual data
-	y=[]
-	for band in x:
-		y.append(round(rev_df.loc[band].sum()))
-
-	# Return the data as a dictionary for the figure
-	return {
-		'data': [go.Pie(
-			labels=[re.sub(',00[0|1]', 'k', b) for b in x],
-			text=['${:,.0f}'.format(v) for v in y],
-			textinfo='label+percent',
-			values=y,
-			marker={'colors': colors},
-			hoverinfo='text',
-			hoverlabel={'font': {'family': font}}
-		)],
-		'layout': {
-			'title': 'Percentage of IL Tax Revenue<br>by Income Bracket',
-			'titlefont': {
-				'family': font
-			},
-			'showlegend': False
-		}
-	}
+# Revenue outputs only depend on the rate vector, so compute them once
+@memoize(LRUCache(maxsize=256))
+def revenue_outputs(rates):
+
+	# Apply each rate to its band in the shared matrix
+	rev_matrix = revenue_matrix(rates).round(-7)
+	y = bracket_revenue(rates).round().tolist()
+	total = sum(y)
+
+	# Return the bar, total, difference, and pie in callback order
+	return (
+		revenue_bar(rev_matrix),
+		collection_total(total),
+		collection_difference(total),
+		revenue_pie(y)
+	)
 
 
 '''
-INPUT CALLBACK FOR EXAMPLE TAX
+PRESET TABLE
 '''
-# Calculate the total tax charged, given an AGI
-def calculate_tax(agi, taxes):
+# Slider values as the sliders hold them, rounded to 4 decimal places
+def slider_values(rates):
+	return tuple(round(r, 4) for r in rates)
+
+# Revenue, split, shares, difference, and outputs for every preset
+def build_preset_table():
+	table = {}
+	for d in tax_dict:
+		values = slider_values(d['rates'])
+		y = bracket_revenue(values).round().tolist()
+		total = sum(y)
+		table[d['value']] = {
+			'label': d['label'],
+			'rates': values,
+			'revenue': total,
+			'split': dict(zip(x, y)),
+			'shares': dict(zip(x, [v / total for v in y])),
+			'difference': total - baseline_revenue,
+			'outputs': revenue_outputs(values)
+		}
+	return table
+
+# Table as plain JSON, built by one worker for each version of the AGI data
+def load_preset_table():
+	table = shared_cache.get_or_compute(
+		'preset-table',
+		lambda: json.loads(to_json(build_preset_table())),
+		version=render_cache.version_key()
+	)
+	return {k:dict(p, rates=tuple(p['rates'])) for k,p in table.items()}  # Must be tuples for comparison
 
-	# Iterate across the income brackets
-	tax = 0
-	for i, b in enumerate(brackets):
-		if b[0] < agi:
+# Loaded at startup, so picking a preset is a dictionary hit
+preset_table = load_preset_table()
+preset_outputs = {p['rates']: p['outputs'] for p in preset_table.values()}
 
-			# Calculate the tax
-			amt = min(b[1], agi) - b[0]
-			tax += amt * taxes[i]
+# Comparison of every preset as JSON, without the rendered outputs
+@server.route('/api/presets', methods=['GET'])
+def presets_api():
+	keys = ['label', 'rates', 'revenue', 'split', 'shares', 'difference']
+	return jsonify({k:{f:p[f] for f in keys} for k,p in preset_table.items()})
 
-	# Return the tax
-	return tax
 
+'''
+CLIENTSIDE CALLBACKS FOR EXAMPLE TAX
+'''
 # Callback for div showing IL flat tax on this AGI
-@dash_app_input.callback(
+dash_app_input.clientside_callback(
+	dash.dependencies.ClientsideFunction('tax_input', 'old_tax'),
 	dash.dependencies.Output('output-old-calc', 'children'),
-	[dash.dependencies.Input('input-agi-calc', 'value')]
-)
-
-# Display the total tax for this AGI using IL flat tax
-def agi_old_callback(*values):
-
-	# Calculate the tax using the values
-	old_tax = calculate_tax(values[0], [0.0495] * 5)
-
-	# Return the data formatted with dollar sign
-	return html.H4('${:,.0f}'.format(old_tax))
-
-# Callback for div showing tax on this AGI
-@dash_app_input.callback(
-	dash.dependencies.Output('output-agi-calc', 'children'),
-	[dash.dependencies.Input('input-agi-calc', 'value')] +
-	[dash.dependencies.Input('slider-{}'.format(j), 'value') for j, b in enumerate(x)]
+	[dash.dependencies.Input('input-agi-calc', 'value')],
+	[dash.dependencies.State('clientside-config', 'data')]
 )
 
-# Display the total tax for this AGI
-def agi_calc_callback(*values):
-
-	# Calculate the tax using the values
-	new_tax = calculate_tax(values[0], values[1:])
+# Callbacks for the tax on this AGI, the difference, and the illustration
+for output, function_name in [
+		(dash.dependencies.Output('output-agi-calc', 'children'), 'new_tax'),
+		(dash.dependencies.Output('difference-agi-calc', 'children'), 'tax_difference'),
+		(dash.dependencies.Output('graph-agi-calc', 'figure'), 'tax_graph')
+	]:
+	dash_app_input.clientside_callback(
+		dash.dependencies.ClientsideFunction('tax_input', function_name),
+		output,
+		[dash.dependencies.Input('input-agi-calc', 'value')] +
+		[dash.dependencies.Input('slider-{}'.format(j), 'value') for j, b in enumerate(x)],
+		[dash.dependencies.State('clientside-config', 'data')]
+	)
 
-	# Return the data formatted with dollar sign
-	return html.H4('${:,.0f}'.format(new_tax))
 
-# Callback showing the difference on the tax compared to flat tax
-@dash_app_input.callback(
-	dash.dependencies.Output('difference-agi-calc', 'children'),
-	[dash.dependencies.Input('input-agi-calc', 'value')] +
-	[dash.dependencies.Input('slider-{}'.format(j), 'value') for j, b in enumerate(x)]
+'''
+SLIDER CALLBACK FOR REVENUE
+'''
+# One callback fans the rate vector out to every revenue output
+@compact_callback(
+	dash_app_input,
+	[
+		dash.dependencies.Output('tax-revenue-bar', 'figure'),
+		dash.dependencies.Output('total-collected', 'children'),
+		dash.dependencies.Output('collected-difference', 'children'),
+		dash.dependencies.Output('tax-revenue-pie', 'figure')
+	],
+	[dash.dependencies.Input('slider-{}'.format(j), 'value') for j, b in enumerate(x)],
+	[dash.dependencies.State('session-id', 'children')] +
+	[dash.dependencies.State('input-agi-calc', 'value')]
 )
 
-# Subtract old tax from the new tax
-def agi_diff_callback(*values):
-
-	# Calculate the taxes using the values
-	new_tax = calculate_tax(values[0], values[1:])
-	old_tax = calculate_tax(values[0], [0.0495] * 5)
-	diff = new_tax - old_tax
+# Create the outputs and send the data to the kvs store function
+def rates_callback(*values):
+	income = values[-1]
+	session_id = values[-2]
+	rates = tuple(values[:-2])  # Hashable key for the cache
 
-	# Return the data formatted with dollar sign and indicator
-	if diff > 0:
-		return html.H4('+${:,.0f}'.format(abs(diff)), style={'color': red})
-	elif diff == 0:
-		return html.H4('${:,.0f}'.format(abs(diff)))
+	# If on Heroku, use forwarded IP
+	if 'ON_HEROKU' not in os.environ:
+		ip = request.remote_addr
 	else:
-		return html.H4('-${:,.0f}'.format(abs(diff)), style={'color': green})
+		ip = request.headers['X-Forwarded-For']
 
-# Callback for horizontal stacked bar showing tax illustration
-@dash_app_input.callback(
-	dash.dependencies.Output('graph-agi-calc', 'figure'),
-	[dash.dependencies.Input('input-agi-calc', 'value')] +
-	[dash.dependencies.Input('slider-{}'.format(j), 'value') for j, b in enumerate(x)]
-)
+	# Send data about graph change to kvs
+	slider_pos = {k:v for k,v in zip(x, rates)}
+	kvs_data = {
+		'session_id': session_id,
+		'timestamp': datetime.now().isoformat(),
+		'request_ip': ip,
+		'tax_rates': slider_pos,
+		'income': income
+	}
+	send_kvs_data(kvs_data)
 
-# Graph shows total income, colors for bands, amt of income in bands, and tax
-def agi_graph_callback(*values):
-	return example_bar_graphs(values)  # Same function for examples at top of page
+	# Return every output from the preset table or the cached computation
+	outputs = preset_outputs.get(rates)
+	if outputs is None:
+		outputs = revenue_outputs(rates)
+	return list(outputs)
 
 
 '''
 SLIDER DROPDOWN CALLBACK
 '''
 # Callback for dropdown menu for changing tax rates based on presets
-@dash_app_input.callback(
-	dash.dependencies.Output('all-sliders', 'children'),
+@compact_callback(
+	dash_app_input,
+	[dash.dependencies.Output('slider-{}'.format(j), 'value') for j, b in enumerate(x)],
 	[dash.dependencies.Input('slider-dropdown', 'value')],
 	[dash.dependencies.State('slider-{}'.format(j), 'value') for j, b in enumerate(x)]
 )
 
-# Check if the values are the same and update the sliders
+# Check if the values are the same and update only the slider values
 def dropdown_callback(*values):
 
 	# Get the choice and current slider values
 	choice = values[0]
-	new_values = [d for d in tax_dict if d['value'] == choice][0]['rates']
-	current = list(values[1:])  # Must be list for comparison
+	preset = preset_table[choice]
+	current = tuple(values[1:])  # Must be tuple for comparison
 
-	# If the values are different from the choice
-	if current != new_values:
+	# If the values are different from the choice, compared as the sliders round them
+	if current != preset['rates']:
 
-		# Return the new sliders using the new values
-		return create_sliders(values=new_values, default=choice)
+		# Return the preset's values, and the text inputs follow the sliders
+		return list(preset['rates'])
 
-	# If the values are the same, prevent a callback infinite loop
+	# If the values are the same, there is nothing to update
 	else:
-		raise dash.exceptions.PreventUpdate()
\ No newline at end of file
+		raise dash.exceptions.PreventUpdate()
+
+
+'''
+METRICS
+'''
+# Time every server callback registered above
+instrument_callbacks(dash_app_input)
\ No newline at end of file
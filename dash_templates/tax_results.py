@@ -6,86 +6,46 @@ INITIALIZE DASH APP
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-import plotly.graph_objs as go
 from textwrap import dedent
 
 # Import packages for data retrieval, post, and cleaning
-import os
-import pandas as pd
-import re
 import sys
 
 # Import styles that apply to all Dash apps
 from styling import *
 
+# Import the figure templates and the cache for invariant renders
+from figures import rate_quantile_bar, tax_rate_bar, trajectory_lines
+from render_cache import encode, render_cache, serve_cached_layout
+from responses import compact_callback
+
 # Import from app file in parent directory
 sys.path.append('..')
 from server import (
 	app as server,
+	get_location_averages,
+	get_rate_histogram,
 	get_session_kvs_data,
-	get_all_submit_kvs_data
+	get_submit_averages,
+	get_trajectory_summary
 )
+from agi_data import x
+from metrics import instrument_callbacks
 
 # Initialize the dash app with Flask app as server on index
 dash_app_results = dash.Dash(
 	__name__, 
 	external_stylesheets=external_stylesheets, 
 	server=server,
-	url_base_pathname='/results/'
+	url_base_pathname='/results/',
+	assets_ignore='tax_input',  # Clientside callbacks for the input app only
+	compress=False  # The server compresses every response
 )
 
 
-'''
-DATA FROM CSV
-'''
-# Open the data from csv and get the x-axis values
-csv_path = os.path.join(server.static_folder, 'data', 'agi_data.csv')
-df = pd.read_csv(csv_path, index_col=0)
-x = df.index.tolist()  # x-axis on most graphs
-
-
 '''
 TAX RATE BAR CHART
 '''
-# Function for returning bar graph of rates
-def tax_rate_bar(tax_rates, title):
-	rates = [round(tax_rates[v] * 100.0, 2) for v in x]
-	tax_data = [{
-		'x': [re.sub(',00[0|1]', 'k', k) for k in x],
-		'y': [round(tax_rates[v] * 100.0, 2) for v in x],
-		'type': 'bar',
-		'hoverinfo': 'y',
-		'marker': {
-			'color': colors
-		}
-	}]
-
-	# Range is 17.5% unless one of the graphs exceeds it
-	if max(rates) > 17.5:
-		ymax = max(rates)
-	else:
-		ymax = 17.5
-
-	# Return the data for the figure
-	return go.Figure(
-		data=tax_data,
-		layout=go.Layout(
-			title=title,
-			titlefont={'family': font},
-			yaxis={
-				'title':'Tax Rate for Bracket',
-				'titlefont': {'family': font},
-				'ticksuffix': '%',
-				'range': [0, ymax]
-			},
-			xaxis={
-				'title':'Income Bracket',
-				'titlefont': {'family': font}
-			},
-			showlegend=False
-		)
-	)
-
 # Standard chart for IL flat tax
 def IL_standard():
 	tax_rates = {k:0.0495 for k in x}
@@ -94,24 +54,46 @@ def IL_standard():
 
 # Get the average of all submitted values for the graph
 def avg_submitted():
-	data, count = get_all_submit_kvs_data()
+	avgs, count = get_submit_averages()
 
-	# Average the keys
-	k = data[0]['tax_rates'].keys()
-	avgs = {}
-	for x in k:
-		values = [v['tax_rates'][x] for v in data]
-		avgs[x] = float(sum(values)) / count
+	# Use zeros until the first submit arrives
+	if not count:
+		avgs = {k:0.0 for k in x}
 
 	# Return the tax rate bar
 	title = 'Average IL Tax Rates<br>Selected by {} Other Users'.format(count)
 	return tax_rate_bar(avgs, title)
 
+# Get the average of the values submitted from a location, from the cached summaries
+def avg_location(location):
+	avgs, count = get_location_averages([location])[location]
+	if not count:
+		avgs = {k:0.0 for k in x}
+	title = 'Average Tax Rates Selected<br>by {} Users in {}'.format(count, location)
+	return tax_rate_bar(avgs, title)
+
+# Get the median and middle half of all submitted values from the histograms
+def median_submitted():
+	histogram = get_rate_histogram()
+	title = 'Median IL Tax Rates<br>with the Middle Half of {} Users'.format(histogram.total())
+	return rate_quantile_bar(
+		histogram.quantile(0.25), histogram.quantile(0.5), histogram.quantile(0.75), title)
+
+
+'''
+SESSION TRAJECTORY CHART
+'''
+# Average rates over the course of submitted sessions, from the pre-aggregated sums
+def avg_trajectory():
+	summary = get_trajectory_summary()
+	title = 'How {} Submitted Sessions Moved Their Rates'.format(summary['sessions'])
+	return trajectory_lines(summary, title)
+
 '''
 LAYOUT
 '''
 # Provide the layout of the app in a function with session_id as param
-def serve_layout():
+def serve_layout(average_figure=None, trajectory_figure=None, median_figure=None):
 	return html.Div(children=[
 
 		# Represents the URL bar, doesn't render anything
@@ -155,8 +137,8 @@ def serve_layout():
 				html.P(dcc.Markdown(dedent(
 					'''
 					This app is still a work in progress.
-					Better visualization of results, including time series data on user sessions,
-					is in development.
+					The chart below the rates shows how submitted sessions moved the sliders over time,
+					and better visualization of results is in development.
 					If you have any ideas for how to improve the app,
 					including changes to the data collection and visualization,
 					reach out to Eric and Joe.
@@ -167,11 +149,26 @@ def serve_layout():
 
 		# Show current tax system, user tax system, average tax system
 		html.Div(children=[
-			dcc.Graph(figure=IL_standard(), id='current-tax-rates', className='col-md-4'),
+			dcc.Graph(figure=render_cache.get('IL_standard', IL_standard),
+				id='current-tax-rates', className='col-md-4'),
 			dcc.Graph(id='session-tax-rates', className='col-md-4'),
-			dcc.Graph(figure=avg_submitted(), id='average-tax-rates', className='col-md-4')
+			dcc.Graph(figure=average_figure or avg_submitted(),
+				id='average-tax-rates', className='col-md-4')
 		], className='row', style={'height': '300px', 'padding-top': '2.5%'}),
 
+		# Compare the averages from the user's location with the statewide medians
+		html.Div(children=[
+			dcc.Graph(id='location-tax-rates', className='col-md-4 offset-md-2'),
+			dcc.Graph(figure=median_figure or median_submitted(),
+				id='median-tax-rates', className='col-md-4')
+		], className='row', style={'height': '300px', 'padding-top': '4.25%'}),
+
+		# Show the average rates and distance from the submit over the sessions
+		html.Div(children=[
+			dcc.Graph(figure=trajectory_figure or avg_trajectory(),
+				id='trajectory-tax-rates', className='col-md-12')
+		], className='row', style={'padding-top': '4.25%'}),
+
 		# Direct the user back to the customizer for another session
 		html.Div(children=[
 			html.Div(children=[
@@ -197,20 +194,39 @@ def serve_layout():
 dash_app_results.layout = serve_layout
 dash_app_results.title = 'IL Income Tax Results'
 
+# Only the averages vary, so encode them into the pre-encoded layout
+average_placeholder = '__AVERAGE_FIGURE__'
+trajectory_placeholder = '__TRAJECTORY_FIGURE__'
+median_placeholder = '__MEDIAN_FIGURE__'
+serve_cached_layout(
+	dash_app_results,
+	'results-layout',
+	lambda: serve_layout(average_placeholder, trajectory_placeholder, median_placeholder),
+	{
+		encode(average_placeholder): lambda: encode(avg_submitted()),
+		encode(trajectory_placeholder): lambda: encode(avg_trajectory()),
+		encode(median_placeholder): lambda: encode(median_submitted())
+	}
+)
+
 
 '''
-USER SPECIFIC BAR CHART
+USER SPECIFIC BAR CHARTS
 '''
-# Get the data for the session from the url
-@dash_app_results.callback(
-	dash.dependencies.Output('session-tax-rates', 'figure'),
+# Get the data for the session and its location from the url
+@compact_callback(
+	dash_app_results,
+	[
+		dash.dependencies.Output('session-tax-rates', 'figure'),
+		dash.dependencies.Output('location-tax-rates', 'figure')
+	],
 	[dash.dependencies.Input('url', 'pathname')]
 )
 
 # Serve the page with the session id
 def layout_callback(*values):
 	if not values[0]:
-		return  # Empty return if there's a problem with url
+		raise dash.exceptions.PreventUpdate()  # No update if there's a problem with url
 
 	# Split the url
 	url = values[0].split('/')
@@ -219,11 +235,22 @@ def layout_callback(*values):
 	
 	# If there is no session_id, fail the callback
 	else:
-		return 'An Error Occurred | No session data provided'
+		return 'An Error Occurred | No session data provided', dash.no_update
 
-	# Get the data from the session for the graph
-	tax_rates, location = get_session_kvs_data(session_id)
+	# Get the data from the session for the graph, which may not be readable yet
+	submit = get_session_kvs_data(session_id)
+	if submit is None:
+		title = 'Your Submit Is Still Being Saved<br>Refresh the Page in a Moment'
+		return tax_rate_bar({k:0.0 for k in x}, title), dash.no_update
+	tax_rates, location = submit
 	title = 'Tax Rates Submitted<br>by User in {}'.format(location)
 
-	# Return the graph of the user's tax rates
-	return tax_rate_bar(tax_rates, title)
+	# Return the graphs of the user's tax rates and their location's averages
+	return tax_rate_bar(tax_rates, title), avg_location(location)
+
+
+'''
+METRICS
+'''
+# Time every server callback registered above
+instrument_callbacks(dash_app_results)
\ No newline at end of file
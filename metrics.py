@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+'''
+METRICS
+Timings, call counts, and payload sizes for the Dash callbacks,
+storage, and GeoIP calls, with an optional sampling profiler
+'''
+# Import required packages for the metrics
+from collections import defaultdict
+import flask
+from functools import wraps
+import os
+import sys
+import threading
+import time
+
+
+'''
+SETTINGS
+'''
+# Upper bounds in seconds for the latency histogram buckets
+latency_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Profiler is off unless enabled, and samples every interval when on
+profiler_enabled = os.environ.get('PROFILER_ENABLED', '') == '1'
+profiler_interval = float(os.environ.get('PROFILER_INTERVAL_SECONDS', 0.01))
+profiler_max_stacks = int(os.environ.get('PROFILER_MAX_STACKS', 10000))
+
+
+'''
+REGISTRY
+'''
+# Counts, latency histograms, and payload bytes for each kind and name
+class MetricsRegistry(object):
+	def __init__(self, buckets=latency_buckets):
+		self.buckets = buckets
+		self._series = {}
+		self._responses = {}
+		self._lock = threading.Lock()
+
+	# Series for a kind and name, e.g. callback and rates_callback
+	def _get(self, kind, name):
+		key = (kind, name)
+		series = self._series.get(key)
+		if series is None:
+			with self._lock:
+				series = self._series.setdefault(key, {
+					'count': 0,
+					'errors': 0,
+					'prevented': 0,
+					'seconds': 0.0,
+					'max_seconds': 0.0,
+					'bytes': 0,
+					'buckets': [0] * len(self.buckets)
+				})
+		return series
+
+	# Record one call's latency, outcome, and payload size
+	def observe(self, kind, name, seconds, size=0, outcome='ok'):
+		series = self._get(kind, name)
+		with self._lock:
+			series['count'] += 1
+			series['seconds'] += seconds
+			series['max_seconds'] = max(series['max_seconds'], seconds)
+			series['bytes'] += size
+			if outcome == 'error':
+				series['errors'] += 1
+			elif outcome == 'prevented':
+				series['prevented'] += 1
+			for i, bound in enumerate(self.buckets):
+				if seconds <= bound:
+					series['buckets'][i] += 1
+					break
+
+	# Record one response's size before and after compression
+	def observe_response(self, endpoint, encoding, raw_bytes, sent_bytes):
+		with self._lock:
+			counts = self._responses.setdefault((endpoint, encoding), [0, 0, 0])
+			counts[0] += 1
+			counts[1] += raw_bytes
+			counts[2] += sent_bytes
+
+	# Copy of every series for reporting
+	def snapshot(self):
+		with self._lock:
+			return {
+				key: dict(series, buckets=list(series['buckets']))
+				for key, series in self._series.items()
+			}
+
+	# Copy of the response counts and sizes for reporting
+	def response_snapshot(self):
+		with self._lock:
+			return {key: list(counts) for key, counts in self._responses.items()}
+
+	# Remove every series
+	def clear(self):
+		with self._lock:
+			self._series = {}
+			self._responses = {}
+
+# Registry shared by the Flask server and Dash apps
+registry = MetricsRegistry()
+
+# Size of a value's text, used for payloads already encoded as JSON
+def payload_size(value):
+	try:
+		return len(value)
+	except TypeError:
+		return 0
+
+# Decorator recording the latency and outcome of every call
+def timed(kind, name=None):
+	def decorator(func):
+		label = name or func.__name__
+
+		@wraps(func)
+		def wrapper(*args, **kwargs):
+			start = time.time()
+			outcome = 'error'
+			try:
+				value = func(*args, **kwargs)
+				outcome = 'ok'
+				return value
+			finally:
+				registry.observe(kind, label, time.time() - start, outcome=outcome)
+		return wrapper
+	return decorator
+
+# Time each call of a storage backend by replacing its methods on the instance
+def instrument_storage(storage):
+	for name in ['put_session', 'add_submit', 'add_to_aggregate', 'get_session_items',
+			'get_submit', 'stream_submits', 'stream_location_submits', 'get_aggregate',
+			'get_aggregates', 'scan_sessions']:
+		setattr(storage, name, timed('storage', name)(getattr(storage, name)))
+	return storage
+
+
+'''
+DASH CALLBACKS
+'''
+# Wrap every server callback of a Dash app, after its callbacks are registered
+def instrument_callbacks(dash_app):
+	for entry in dash_app.callback_map.values():
+		if 'callback' not in entry or getattr(entry['callback'], 'instrumented', False):
+			continue  # Clientside callbacks run in the browser
+		entry['callback'] = instrument_callback(entry['callback'])
+
+# Record latency, outcome, and request and response sizes for one callback
+def instrument_callback(callback):
+	from dash.exceptions import PreventUpdate
+	name = callback.__name__
+
+	@wraps(callback)
+	def wrapper(*args, **kwargs):
+		start = time.time()
+		request_size = flask.request.content_length or 0
+		try:
+			response = callback(*args, **kwargs)
+		except PreventUpdate:
+			registry.observe('callback', name, time.time() - start,
+				size=request_size, outcome='prevented')
+			raise
+		except Exception:
+			registry.observe('callback', name, time.time() - start,
+				size=request_size, outcome='error')
+			raise
+		registry.observe('callback', name, time.time() - start,
+			size=request_size + payload_size(response))
+		return response
+	wrapper.instrumented = True
+	return wrapper
+
+
+'''
+PROMETHEUS
+'''
+# Format a label value, escaping quotes and backslashes
+def label(value):
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Text exposition of the registry, plus flat gauges from other components
+def render_prometheus(gauges={}):
+	lines = []
+	series = sorted(registry.snapshot().items())
+
+	# Latency histogram for each kind and name
+	lines.append('# HELP iltax_call_seconds Latency of callbacks, storage, and GeoIP calls')
+	lines.append('# TYPE iltax_call_seconds histogram')
+	for (kind, name), s in series:
+		labels = 'kind="{}",name="{}"'.format(label(kind), label(name))
+		cumulative = 0
+		for bound, count in zip(registry.buckets, s['buckets']):
+			cumulative += count
+			lines.append('iltax_call_seconds_bucket{{{},le="{}"}} {}'.format(
+				labels, bound, cumulative))
+		lines.append('iltax_call_seconds_bucket{{{},le="+Inf"}} {}'.format(labels, s['count']))
+		lines.append('iltax_call_seconds_sum{{{}}} {}'.format(labels, repr(s['seconds'])))
+		lines.append('iltax_call_seconds_count{{{}}} {}'.format(labels, s['count']))
+
+	# Counters for outcomes and payload bytes
+	for metric, key, help_text in [
+			('iltax_call_errors_total', 'errors', 'Calls that raised an exception'),
+			('iltax_call_prevented_total', 'prevented', 'Callbacks that prevented the update'),
+			('iltax_call_payload_bytes_total', 'bytes', 'Request and response bytes of callbacks')
+		]:
+		lines.append('# HELP {} {}'.format(metric, help_text))
+		lines.append('# TYPE {} counter'.format(metric))
+		for (kind, name), s in series:
+			lines.append('{}{{kind="{}",name="{}"}} {}'.format(
+				metric, label(kind), label(name), s[key]))
+
+	# Response counts and bytes before and after compression
+	responses = sorted(registry.response_snapshot().items())
+	for metric, i, help_text in [
+			('iltax_responses_total', 0, 'Responses by endpoint and encoding'),
+			('iltax_response_raw_bytes_total', 1, 'Response bytes before compression'),
+			('iltax_response_sent_bytes_total', 2, 'Response bytes after compression')
+		]:
+		lines.append('# HELP {} {}'.format(metric, help_text))
+		lines.append('# TYPE {} counter'.format(metric))
+		for (endpoint, encoding), counts in responses:
+			lines.append('{}{{endpoint="{}",encoding="{}"}} {}'.format(
+				metric, label(endpoint), label(encoding), counts[i]))
+
+	# Gauges from the caches, writer, and sampler, skipping text values
+	for metric, value in sorted(gauges.items()):
+		if isinstance(value, bool) or not isinstance(value, (int, float)):
+			continue
+		lines.append('# TYPE {} gauge'.format(metric))
+		lines.append('{} {}'.format(metric, repr(float(value))))
+	return '\n'.join(lines) + '\n'
+
+# Flatten nested stats into gauge names, e.g. iltax_geoip_cache_hits
+def flatten_gauges(prefix, stats):
+	gauges = {}
+	for k, v in stats.items():
+		name = '{}_{}'.format(prefix, k)
+		if isinstance(v, dict):
+			gauges.update(flatten_gauges(name, v))
+		else:
+			gauges[name] = v
+	return gauges
+
+
+'''
+SAMPLING PROFILER
+'''
+# Samples the stack of every other thread and counts the collapsed stacks
+class SamplingProfiler(object):
+	def __init__(self, interval=profiler_interval, max_stacks=profiler_max_stacks):
+		self.interval = interval
+		self.max_stacks = max_stacks
+		self.samples = 0
+		self.folded = 0
+		self._stacks = defaultdict(int)
+		self._lock = threading.Lock()
+		self._running = threading.Event()
+		self._thread = None
+		self._pid = None
+
+	# Start sampling in a daemon thread, once per process
+	def start(self):
+		with self._lock:
+			if self._thread is not None and self._pid == os.getpid() and \
+					self._running.is_set():
+				return self
+			self._pid = os.getpid()
+			self._running.set()
+			self._thread = threading.Thread(target=self._run, name='SamplingProfiler')
+			self._thread.daemon = True
+			self._thread.start()
+		return self
+
+	# Stop sampling, keeping the stacks collected so far
+	def stop(self):
+		self._running.clear()
+
+	def running(self):
+		return self._running.is_set() and self._pid == os.getpid()
+
+	# Record the stack of every thread except this one
+	def _run(self):
+		own = threading.current_thread().ident
+		while self._running.is_set():
+			frames = sys._current_frames()
+			with self._lock:
+				for ident, frame in frames.items():
+					if ident == own:
+						continue
+					stack = []
+					while frame is not None:
+						code = frame.f_code
+						stack.append('{}:{}:{}'.format(
+							os.path.basename(code.co_filename), code.co_name, frame.f_lineno))
+						frame = frame.f_back
+					stack = ';'.join(reversed(stack))
+
+					# Each line number makes a new stack, so new stacks past the cap are
+					# folded into one, keeping memory bounded in a long profiling session
+					if stack not in self._stacks and len(self._stacks) >= self.max_stacks:
+						stack = '[other]'
+						self.folded += 1
+					self._stacks[stack] += 1
+				self.samples += 1
+			time.sleep(self.interval)
+
+	# Collapsed stacks, most sampled first, for flame graph tools
+	def collapsed(self, top=None):
+		with self._lock:
+			stacks = sorted(self._stacks.items(), key=lambda s: -s[1])
+		if top:
+			stacks = stacks[:top]
+		return '\n'.join('{} {}'.format(stack, count) for stack, count in stacks) + '\n'
+
+	# Remove every sampled stack
+	def clear(self):
+		with self._lock:
+			self._stacks = defaultdict(int)
+			self.samples = 0
+			self.folded = 0
+
+# Profiler shared by the process, started only when enabled
+profiler = SamplingProfiler()
\ No newline at end of file
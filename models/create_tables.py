@@ -4,9 +4,10 @@ AMAZON DYNAMODB TABLES
 Execute when creating the tables
 '''
 # Import required packages for Amazon DynamoDB
-from resource import dynamodb
+from resource import get_dynamodb, submits_index
+dynamodb = get_dynamodb()
 
-# Table for data describing a session with location as secondary index
+# Table for data describing a session with location and submits as secondary indexes
 sessions = dynamodb.create_table(
 	TableName='ILTaxSessions',
 	KeySchema=[
@@ -39,7 +40,8 @@ sessions = dynamodb.create_table(
 				'ReadCapacityUnits': 5,
 				'WriteCapacityUnits': 5
 			}
-		}
+		},
+		submits_index
 	],
 	AttributeDefinitions=[
 		{
@@ -57,7 +59,32 @@ sessions = dynamodb.create_table(
 		{
 			'AttributeName': 'type',
 			'AttributeType': 'S'
-		}		
+		},
+		{
+			'AttributeName': 'submitted_at',
+			'AttributeType': 'S'
+		}
+	],
+	ProvisionedThroughput={
+		'ReadCapacityUnits': 5,
+		'WriteCapacityUnits': 5
+	}
+)
+
+# Table for running sums of submitted rates, statewide and by location
+aggregates = dynamodb.create_table(
+	TableName='ILTaxAggregates',
+	KeySchema=[
+		{
+			'AttributeName': 'scope',
+			'KeyType': 'HASH'
+		}
+	],
+	AttributeDefinitions=[
+		{
+			'AttributeName': 'scope',
+			'AttributeType': 'S'
+		}
 	],
 	ProvisionedThroughput={
 		'ReadCapacityUnits': 5,
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+'''
+SESSION EXPORT
+Execute to stream the session items into Parquet files partitioned
+by date and location, resuming from the last checkpoint
+'''
+# Import required packages for the export
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import sys
+import uuid
+from storage import get_storage
+
+# Quote was moved in Python 3
+try:
+	from urllib import quote
+except ImportError:
+	from urllib.parse import quote
+
+# Import the bracket labels from the parent directory
+sys.path.append('..')
+from agi_data import x
+
+
+'''
+ROWS
+'''
+# Flat row for an item, with a rate column for each bracket in slider order
+def item_row(item):
+	row = {
+		'session_id': item['session_id'],
+		'timestamp': item['timestamp'],
+		'type': item.get('type', 'slider'),
+		'location': item.get('location'),
+		'income': float(item['income']) if item.get('income') is not None else None,
+		'drag_events': int(item.get('drag_events', 1)),
+		'drag_seconds': float(item.get('drag_seconds', 0))
+	}
+	for i, label in enumerate(x):
+		rate = item.get('tax_rates', {}).get(label)
+		row['rate_{}'.format(i)] = float(rate) if rate is not None else None
+	return row
+
+# Columns in file order with their Parquet types, leaving location to the partition
+column_types = [
+	('session_id', 'string'),
+	('timestamp', 'string'),
+	('type', 'string'),
+	('income', 'float64'),
+	('drag_events', 'int64'),
+	('drag_seconds', 'float64')
+] + [('rate_{}'.format(i), 'float64') for i in range(len(x))]
+columns = [c for c, t in column_types]
+
+# Hive-style partition directory for a row's date and location
+def partition_path(out_dir, row):
+	return os.path.join(
+		out_dir,
+		'date={}'.format(row['timestamp'][:10]),
+		'location={}'.format(quote((row['location'] or 'unknown').encode('utf-8'), safe=''))
+	)
+
+
+'''
+CHECKPOINTS
+'''
+# Watermark of the last finished export, and the key to resume an unfinished one
+def load_checkpoint(path):
+	try:
+		with open(path) as f:
+			return json.load(f)
+	except (IOError, OSError, ValueError):
+		return {'watermark': None, 'since': None, 'until': None, 'resume_key': None}
+
+# Replace the checkpoint atomically, so a crash keeps the previous one
+def save_checkpoint(path, checkpoint):
+	tmp = '{}.{}.tmp'.format(path, os.getpid())
+	with open(tmp, 'w') as f:
+		json.dump(checkpoint, f, default=str)
+	os.rename(tmp, path)
+
+
+'''
+PARQUET
+'''
+# Write each partition's buffered rows as a new part file
+def write_partitions(out_dir, buffers, run_id, part):
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+
+	# Every file gets the same schema, even when a column is all null, e.g. income
+	schema = pa.schema([pa.field(c, pa.type_for_alias(t)) for c, t in column_types])
+	written = 0
+	for path, rows in buffers.items():
+		if not os.path.isdir(path):
+			os.makedirs(path)
+		table = pa.Table.from_arrays(
+			[pa.array([r[c] for r in rows], type=f.type) for c, f in zip(columns, schema)],
+			schema=schema)
+		pq.write_table(
+			table, os.path.join(path, 'part-{}-{:05d}.parquet'.format(run_id, part)))
+		written += len(rows)
+	return written
+
+
+'''
+EXPORT
+'''
+# Stream items in the window after the watermark into the partitions, checkpointing each flush
+def export_sessions(out_dir, checkpoint_path, page_size=1000, flush_rows=50000, lag_seconds=60):
+	storage = get_storage()
+	checkpoint = load_checkpoint(checkpoint_path)
+
+	# Items arrive late from the sampler and writer, so the window ends a lag ago
+	if checkpoint.get('resume_key') is None:
+		until = datetime.now() - timedelta(seconds=lag_seconds)
+		checkpoint.update(since=checkpoint.get('watermark'), until=until.isoformat())
+	since, until = checkpoint['since'], checkpoint['until']
+	key = checkpoint.get('resume_key')
+	run_id = uuid.uuid4().hex[:8]
+	buffers = {}
+	buffered = 0
+	part = 0
+	total = 0
+
+	# Page through the items, following the keys to the end
+	while True:
+		items, key = storage.scan_sessions(start_key=key, since=since, page_size=page_size)
+		for item in items:
+			if item['timestamp'] > until:
+				continue  # Exported by the next run
+			row = item_row(item)
+			buffers.setdefault(partition_path(out_dir, row), []).append(row)
+			buffered += 1
+
+		# Write the buffers and record the key to resume from
+		if buffered >= flush_rows or (key is None and buffered):
+			total += write_partitions(out_dir, buffers, run_id, part)
+			buffers, buffered, part = {}, 0, part + 1
+			checkpoint['resume_key'] = key
+			save_checkpoint(checkpoint_path, checkpoint)
+		if key is None:
+			break
+
+	# The finished export moves the watermark to the end of its window
+	checkpoint.update(watermark=until, since=None, until=None, resume_key=None)
+	save_checkpoint(checkpoint_path, checkpoint)
+	return total
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--out', default=os.path.join('..', 'exports', 'sessions'))
+	parser.add_argument('--checkpoint', help='Defaults to _checkpoint.json in --out')
+	parser.add_argument('--page-size', type=int, default=1000)
+	parser.add_argument('--flush-rows', type=int, default=50000)
+	parser.add_argument('--lag-seconds', type=int, default=60)
+	args = parser.parse_args()
+
+	# Keep the checkpoint with the files it describes
+	if not os.path.isdir(args.out):
+		os.makedirs(args.out)
+	checkpoint_path = args.checkpoint or os.path.join(args.out, '_checkpoint.json')  # Readers skip _ files
+	count = export_sessions(
+		args.out, checkpoint_path, args.page_size, args.flush_rows, args.lag_seconds)
+	print('Exported {} session items to {}'.format(count, args.out))
\ No newline at end of file
@@ -3,13 +3,79 @@
 AMAZON DYNAMODB QUERIES
 '''
 # Import required packages for Amazon DynamoDB
+from decimal import Decimal
 import json
-from resource import dynamodb, DecimalEncoder
+import logging
+from resource import DecimalEncoder, LazyTable
+from writer import SessionWriter
+
+# Aggregates left partly updated are logged, so they can be rebuilt
+logger = logging.getLogger(__name__)
 
 # Sessions tables includes edits to taxes with location as secondary index
-sessions = dynamodb.Table('ILTaxSessions')
+sessions = LazyTable('ILTaxSessions')
+
+# Aggregates table keeps running sums of submitted rates for each scope
+aggregates = LazyTable('ILTaxAggregates')
+all_scope = 'ALL'  # Scope for the statewide aggregate
+
+# Background writer batches session edits, draining on shutdown
+session_writer = SessionWriter(sessions).register_shutdown()
+
+# Key submits into the sparse submits index by their timestamp
+def with_submit_key(data):
+	if data.get('type') == 'submit':
+		data['submitted_at'] = data['timestamp']
+	return data
 
 # Add the edits or final submission to the kvs table
 def put_session(data):
-	response = sessions.put_item(Item=data)
-	return json.dumps(response, indent=4, cls=DecimalEncoder)
\ No newline at end of file
+	response = sessions.put_item(Item=with_submit_key(data))
+	return json.dumps(response, indent=4, cls=DecimalEncoder)
+
+# Queue the edits or final submission for the background writer
+def queue_session(data):
+	return session_writer.put(with_submit_key(data))
+
+# Add each value to its running sum in a scope's aggregate with atomic updates
+def add_to_aggregate(scope, values, chunk_size=100):
+	items = sorted(values.items())
+
+	# Expressions are limited to 4 KB, so large updates are split into chunks. Each chunk is
+	# its own update, so a failed chunk leaves the chunks before it applied, and the failure
+	# is logged with the scope so the sums can be recomputed with rebuild_aggregates.py
+	chunks = (len(items) + chunk_size - 1) // chunk_size
+	for start in range(0, len(items), chunk_size):
+		chunk = items[start:start + chunk_size]
+
+		# Names like bracket labels are attribute names, so pass them as placeholders
+		names = {'#a{}'.format(i): k for i, (k, v) in enumerate(chunk)}
+		numbers = {
+			':v{}'.format(i): v if isinstance(v, (int, Decimal)) else Decimal(repr(float(v)))
+			for i, (k, v) in enumerate(chunk)
+		}
+		adds = ['#a{0} :v{0}'.format(i) for i in range(len(chunk))]
+
+		# Atomic ADD creates the item and attributes on the first update
+		try:
+			aggregates.update_item(
+				Key={'scope': scope},
+				UpdateExpression='ADD {}'.format(', '.join(adds)),
+				ExpressionAttributeNames=names,
+				ExpressionAttributeValues=numbers
+			)
+		except Exception:
+			if start:
+				logger.error(
+					'Aggregate %s is partly updated: chunk %d of %d failed after the ones before it '
+					'were applied, run rebuild_aggregates.py, with --trajectories for a trajectory '
+					'scope, to recompute it',
+					scope, start // chunk_size + 1, chunks)
+			raise
+
+# Add a submit's rates to the running sums, statewide and for its location
+def add_submit_to_aggregates(data):
+	values = dict(data['tax_rates'])
+	values['submit_count'] = 1
+	for scope in [all_scope, data['location']]:
+		add_to_aggregate(scope, values)
\ No newline at end of file
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+'''
+AMAZON DYNAMODB SUBMITS INDEX MIGRATION
+Execute once to add the sparse submits index to an existing sessions table
+'''
+# Import required packages for Amazon DynamoDB
+import time
+from inserts import sessions
+from resource import submits_index
+from queries import scan_segment
+
+# Add the index unless the table already has it
+def add_submits_index():
+	table = sessions.meta.client.describe_table(TableName='ILTaxSessions')['Table']
+	names = [i['IndexName'] for i in table.get('GlobalSecondaryIndexes', [])]
+	if submits_index['IndexName'] in names:
+		return False
+	sessions.meta.client.update_table(
+		TableName='ILTaxSessions',
+		AttributeDefinitions=[
+			{
+				'AttributeName': 'session_id',
+				'AttributeType': 'S'
+			},
+			{
+				'AttributeName': 'submitted_at',
+				'AttributeType': 'S'
+			}
+		],
+		GlobalSecondaryIndexUpdates=[
+			{
+				'Create': submits_index
+			}
+		]
+	)
+	return True
+
+# Wait until the new index has finished building
+def wait_for_index(poll_seconds=10):
+	while True:
+		table = sessions.meta.client.describe_table(TableName='ILTaxSessions')['Table']
+		statuses = {
+			i['IndexName']: i['IndexStatus'] for i in table.get('GlobalSecondaryIndexes', [])
+		}
+		if statuses.get(submits_index['IndexName']) == 'ACTIVE':
+			return
+		time.sleep(poll_seconds)
+
+# Copy each submit's timestamp to submitted_at, one page of the table at a time
+def backfill_submits():
+	from boto3.dynamodb.conditions import Attr
+	count = 0
+	for item in scan_segment(
+			ProjectionExpression='#sid, #ts',
+			ExpressionAttributeNames={'#sid': 'session_id', '#ts': 'timestamp'},
+			FilterExpression=Attr('type').eq('submit') & Attr('submitted_at').not_exists()
+		):
+		sessions.update_item(
+			Key={'session_id': item['session_id'], 'timestamp': item['timestamp']},
+			UpdateExpression='SET submitted_at = #ts',
+			ExpressionAttributeNames={'#ts': 'timestamp'}
+		)
+		count += 1
+	return count
+
+if __name__ == '__main__':
+	if add_submits_index():
+		print('Creating {}'.format(submits_index['IndexName']))
+	count = backfill_submits()
+	print('Backfilled {} submits'.format(count))
+	wait_for_index()
+	print('{} is active'.format(submits_index['IndexName']))
\ No newline at end of file
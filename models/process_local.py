@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+'''
+PROCESS-LOCAL RESOURCES
+Threads and SQLite connections can't be shared across a fork,
+so each gunicorn worker creates its own on first use
+'''
+# Import required packages for the threads and connections
+import os
+import sqlite3
+import threading
+
+
+'''
+BACKGROUND THREADS
+'''
+# Daemon thread started lazily, once in each process
+class ProcessThread(object):
+	def __init__(self, target, name):
+		self.target = target
+		self.name = name
+		self._thread = None
+		self._pid = None
+		self._lock = threading.Lock()
+
+	# Whether this process has started the thread
+	def started(self):
+		return self._thread is not None and self._pid == os.getpid()
+
+	# Start the thread unless this process already has, calling before_start first
+	def ensure_started(self, before_start=None):
+		if self.started():
+			return
+		with self._lock:
+			if not self.started():
+				if before_start is not None:
+					before_start()
+				self._pid = os.getpid()
+				self._thread = threading.Thread(target=self.target, name=self.name)
+				self._thread.daemon = True
+				self._thread.start()
+
+	# Wait for this process's thread to finish, so the next start makes a new one
+	def join(self, timeout=None):
+		if self.started():
+			self._thread.join(timeout)
+		self._thread = None
+
+
+'''
+SQLITE CONNECTIONS
+'''
+# One connection per thread and process to a SQLite file in WAL mode, creating the schema on connect
+class SQLiteConnections(object):
+	def __init__(self, path, schema=()):
+		self.path = path
+		self.schema = schema
+		self._local = threading.local()
+
+	# Connection for the calling thread
+	def get(self):
+		conn = getattr(self._local, 'conn', None)
+		if conn is None or self._local.pid != os.getpid():
+			conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+			conn.execute('PRAGMA journal_mode=WAL')
+			conn.execute('PRAGMA synchronous=NORMAL')
+			for statement in self.schema:
+				conn.execute(statement)
+			self._local.conn = conn
+			self._local.pid = os.getpid()
+		return conn
\ No newline at end of file
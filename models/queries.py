@@ -3,21 +3,222 @@
 AMAZON DYNAMODB QUERIES
 '''
 # Import required packages for Amazon DynamoDB
-from boto3.dynamodb.conditions import Attr, Key
-from resource import dynamodb
+from functools import partial
+from resource import LazyTable, get_dynamodb, submits_index
+import threading
+import time
+
+# Queue was renamed in Python 3
+try:
+	from Queue import Queue, Full
+except ImportError:
+	from queue import Queue, Full
 
 # Sessions tables includes edits to taxes with location as secondary index
-sessions = dynamodb.Table('ILTaxSessions')
+sessions = LazyTable('ILTaxSessions')
+
+# Aggregates table keeps running sums of submitted rates for each scope
+aggregates = LazyTable('ILTaxAggregates')
+
+# Sparse index with only the submits, keyed by session
+submits_index_name = submits_index['IndexName']
+
+# Index of every item, keyed by location and type
+sessions_index_name = 'ILTaxSessionsIndex'
+
+# Attributes returned for submits, with placeholders for reserved words
+submit_projection = '#sid, #ts, #loc, #typ, tax_rates, income'
+submit_names = {
+	'#sid': 'session_id',
+	'#ts': 'timestamp',
+	'#loc': 'location',
+	'#typ': 'type'
+}
+
+# Scan one segment of a table or index, following LastEvaluatedKey to the end
+def scan_segment(segment=0, total_segments=1, **kwargs):
+	if total_segments > 1:
+		kwargs.update(Segment=segment, TotalSegments=total_segments)
+	while True:
+		response = sessions.scan(**kwargs)
+		for item in response['Items']:
+			yield item
+		if 'LastEvaluatedKey' not in response:
+			return
+		kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+# Scan one page of the table after a timestamp, returning the key to resume from
+def scan_sessions_page(start_key=None, since=None, page_size=1000):
+	from boto3.dynamodb.conditions import Attr
+	kwargs = {'Limit': page_size}
+	if start_key:
+		kwargs['ExclusiveStartKey'] = start_key
+	if since:
+		kwargs['FilterExpression'] = Attr('timestamp').gt(since)
+	response = sessions.scan(**kwargs)
+	return response['Items'], response.get('LastEvaluatedKey')
+
+# Run each producer in a thread and yield their items through a bounded buffer
+def merge_threads(producers, buffer_size=1000):
+	if len(producers) == 1:
+		for item in producers[0]():
+			yield item
+		return
+
+	# Threads put items, errors, and a done marker on the buffer
+	buffer = Queue(maxsize=buffer_size)
+	stop = threading.Event()
+	done = object()
+
+	# Keep retrying the put so a closed generator can stop the threads
+	def put(value):
+		while not stop.is_set():
+			try:
+				buffer.put(value, timeout=0.1)
+				return True
+			except Full:
+				pass
+		return False
+
+	# Run a producer into the buffer
+	def worker(producer):
+		try:
+			for item in producer():
+				if not put(item):
+					return
+		except Exception as e:
+			put(e)
+		put(done)
+
+	# Start a daemon thread for every producer
+	for producer in producers:
+		thread = threading.Thread(target=worker, args=(producer,))
+		thread.daemon = True
+		thread.start()
+
+	# Yield until every producer is done, raising the first error
+	try:
+		finished = 0
+		while finished < len(producers):
+			value = buffer.get()
+			if value is done:
+				finished += 1
+			elif isinstance(value, Exception):
+				raise value
+			else:
+				yield value
+	finally:
+		stop.set()
+
+# Scan the segments in parallel threads
+def parallel_scan(segments=4, buffer_size=1000, **kwargs):
+	segments = max(segments, 1)
+	producers = [partial(scan_segment, segment, segments, **kwargs) for segment in range(segments)]
+	return merge_threads(producers, buffer_size)
+
+# Stream submitted items from the sparse index, projecting on the server
+def scan_submit_items(segments=4):
+	return parallel_scan(
+		segments=segments,
+		IndexName=submits_index_name,
+		ProjectionExpression=submit_projection,
+		ExpressionAttributeNames=submit_names
+	)
 
 # Get submitted items from the table using secondary index
 def get_all_submit_items():
-	response = sessions.scan(IndexName='ILTaxSessionsIndex')
-	return response['Items'], response['Count']
+	items = list(scan_submit_items())
+	return items, len(items)
 
-# Get specific submit item
+# Get the latest submit for a session with a single item read from the sparse index.
+# Index reads are eventually consistent, so a submit written a moment ago may be
+# missing, and then the session is read from the table with a consistent read
 def get_specific_submit_item(session_id):
+	from boto3.dynamodb.conditions import Attr, Key
 	response = sessions.query(
+		IndexName=submits_index_name,
 		KeyConditionExpression=Key('session_id').eq(session_id),
-		FilterExpression=Attr('type').contains('submit')
+		ScanIndexForward=False,
+		Limit=1
 	)
-	return response['Items']
\ No newline at end of file
+	if response['Items']:
+		return response['Items']
+
+	# Newest first, following the pages until a submit turns up
+	kwargs = {
+		'KeyConditionExpression': Key('session_id').eq(session_id),
+		'FilterExpression': Attr('type').eq('submit'),
+		'ScanIndexForward': False,
+		'ConsistentRead': True
+	}
+	while True:
+		response = sessions.query(**kwargs)
+		if response['Items'] or 'LastEvaluatedKey' not in response:
+			return response['Items'][:1]
+		kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+# Get every item of a session in timestamp order, following the pages
+def get_session_items(session_id):
+	from boto3.dynamodb.conditions import Key
+	kwargs = {'KeyConditionExpression': Key('session_id').eq(session_id)}
+	items = []
+	while True:
+		response = sessions.query(**kwargs)
+		items.extend(response['Items'])
+		if 'LastEvaluatedKey' not in response:
+			return items
+		kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+# Query the submits of one location from the location index, following the pages
+def query_location(location):
+	from boto3.dynamodb.conditions import Key
+	kwargs = {
+		'IndexName': sessions_index_name,
+		'KeyConditionExpression': Key('location').eq(location) & Key('type').eq('submit'),
+		'ProjectionExpression': submit_projection,
+		'ExpressionAttributeNames': submit_names
+	}
+	while True:
+		response = sessions.query(**kwargs)
+		for item in response['Items']:
+			yield item
+		if 'LastEvaluatedKey' not in response:
+			return
+		kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+# Query each location in turn
+def query_locations(locations):
+	for location in locations:
+		for item in query_location(location):
+			yield item
+
+# Stream the submits of several locations, spreading the queries over the threads
+def query_location_submits(locations, workers=4, buffer_size=1000):
+	locations = list(locations)
+	workers = max(min(workers, len(locations)), 1)
+	producers = [partial(query_locations, locations[i::workers]) for i in range(workers)]
+	return merge_threads(producers, buffer_size)
+
+# Get the running sums of submitted rates for a scope with a single read
+def get_submit_aggregate(scope='ALL'):
+	response = aggregates.get_item(Key={'scope': scope})
+	return response.get('Item')
+
+# Get the running sums of several scopes, 100 keys per batch read
+def get_submit_aggregates(scopes):
+	scopes = list(set(scopes))
+	found = {}
+	for start in range(0, len(scopes), 100):
+		request = {aggregates.name: {'Keys': [{'scope': s} for s in scopes[start:start + 100]]}}
+
+		# Retry the keys DynamoDB left unprocessed under throttling, backing off
+		delay = 0.05
+		while request:
+			response = get_dynamodb().batch_get_item(RequestItems=request)
+			for item in response['Responses'].get(aggregates.name, []):
+				found[item['scope']] = item
+			request = response.get('UnprocessedKeys')
+			if request:
+				time.sleep(delay)
+				delay = min(delay * 2, 1.0)
+	return found
\ No newline at end of file
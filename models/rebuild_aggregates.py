@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+'''
+AMAZON DYNAMODB AGGREGATES
+Execute to recompute the submit aggregates from the sessions table,
+and the trajectory sums too with --trajectories
+'''
+# Import required packages for Amazon DynamoDB
+from collections import defaultdict
+from decimal import Decimal
+import sys
+from inserts import aggregates, all_scope
+from queries import get_session_items, scan_submit_items
+
+# Import the rate histograms and trajectories from the parent directory
+sys.path.append('..')
+from sketches import RateHistogram
+from trajectories import session_deltas, trajectory_scope
+
+# Trajectories read every item of each submitted session, so they are only rebuilt on request
+rebuild_trajectories = '--trajectories' in sys.argv
+
+# Sum the rates of every submit, statewide and for each location
+sums = defaultdict(lambda: defaultdict(Decimal))
+counts = defaultdict(int)
+histograms = defaultdict(RateHistogram)
+submitted = set()
+for item in scan_submit_items():
+	submitted.add(item['session_id'])
+	for scope in [all_scope, item['location']]:
+		counts[scope] += 1
+		for k, v in item['tax_rates'].items():
+			sums[scope][k] += v
+		histograms[scope].add(item['tax_rates'])
+
+# Overwrite each aggregate with the recomputed sums
+with aggregates.batch_writer() as batch:
+	for scope, rates in sums.items():
+		agg = dict(rates)
+		agg['scope'] = scope
+		agg['submit_count'] = counts[scope]
+		batch.put_item(Item=agg)
+
+		# Histogram counts are stored only for the bins with submits, split across items
+		for hist_scope, hist in histograms[scope].items(scope).items():
+			hist['scope'] = hist_scope
+			batch.put_item(Item=hist)
+print('Rebuilt {} aggregates from {} submits'.format(len(sums), counts[all_scope]))
+
+# Sum the trajectory of every submitted session, e.g. after a partly applied update
+if rebuild_trajectories:
+	trajectory = defaultdict(float)
+	for session_id in submitted:
+		deltas = session_deltas(get_session_items(session_id))
+		for k, v in (deltas or {}).items():
+			trajectory[k] += v
+	agg = {k: Decimal(repr(v)) for k, v in trajectory.items()}
+	agg['scope'] = trajectory_scope
+	aggregates.put_item(Item=agg)
+	print('Rebuilt the trajectories of {} sessions'.format(len(submitted)))
\ No newline at end of file
@@ -1,37 +1,96 @@
 # -*- coding: utf-8 -*-
 '''
 AMAZON DYNAMODB RESOURCE
+Built on first use, so importing the models doesn't load boto3
 '''
 # Import required packages for Amazon DynamoDB
-from boto3 import resource, session
 import decimal
 import json
-from os import environ
-
-# Check if we are on Heroku, and use config if not
-if 'ON_HEROKU' not in environ:
-	import sys
-	sys.path.append('..')
-	from config import Config
-
-	# Set the resource using config
-	dynamodb = resource(
-		'dynamodb',
-		config=session.Config(signature_version='s3v4'),
-		region_name=Config.AWS_REGION_NAME,
-		aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
-		aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY
-	)
-
-# Otherwise, set using environ
-else:
-	dynamodb = resource(
-		'dynamodb',
-		config=session.Config(signature_version='s3v4'),
-		region_name=environ['AWS_REGION_NAME'],
-		aws_access_key_id=environ['AWS_ACCESS_KEY_ID'],
-		aws_secret_access_key=environ['AWS_SECRET_ACCESS_KEY']
-	)
+from os import environ, getpid
+import threading
+
+# Resource shared by every table in the process
+_dynamodb = None
+_pid = None
+_lock = threading.Lock()
+
+# Build the resource the first time a table is used in each process,
+# since the layouts read the aggregates in the master before gunicorn forks
+def get_dynamodb():
+	global _dynamodb, _pid
+	if _dynamodb is not None and _pid == getpid():
+		return _dynamodb
+	with _lock:
+		if _dynamodb is None or _pid != getpid():
+			_dynamodb = create_dynamodb()
+			_pid = getpid()
+	return _dynamodb
+
+# Create the resource from config or environ
+def create_dynamodb():
+	from boto3 import resource, session
+
+	# Check if we are on Heroku, and use config if not
+	if 'ON_HEROKU' not in environ:
+		import sys
+		sys.path.append('..')
+		from config import Config
+
+		# Set the resource using config
+		return resource(
+			'dynamodb',
+			config=session.Config(signature_version='s3v4'),
+			region_name=Config.AWS_REGION_NAME,
+			aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
+			aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY,
+			endpoint_url=environ.get('DYNAMODB_ENDPOINT_URL')  # DynamoDB Local for testing
+		)
+
+	# Otherwise, set using environ
+	else:
+		return resource(
+			'dynamodb',
+			config=session.Config(signature_version='s3v4'),
+			region_name=environ['AWS_REGION_NAME'],
+			aws_access_key_id=environ['AWS_ACCESS_KEY_ID'],
+			aws_secret_access_key=environ['AWS_SECRET_ACCESS_KEY'],
+			endpoint_url=environ.get('DYNAMODB_ENDPOINT_URL')
+		)
+
+# Index of submits only, sparse since only submits have submitted_at
+submits_index = {
+	'IndexName': 'ILTaxSubmitsIndex',
+	'KeySchema': [
+		{
+			'AttributeName': 'session_id',
+			'KeyType': 'HASH'
+		},
+		{
+			'AttributeName': 'submitted_at',
+			'KeyType': 'RANGE'
+		}
+	],
+	'Projection': {
+		'ProjectionType': 'ALL'
+	},
+	'ProvisionedThroughput': {
+		'ReadCapacityUnits': 5,
+		'WriteCapacityUnits': 5
+	}
+}
+
+# Table handle that builds the resource and table on first attribute access in each process
+class LazyTable(object):
+	def __init__(self, name):
+		self.name = name
+		self._table = None
+		self._pid = None
+
+	def __getattr__(self, attr):
+		if self._table is None or self._pid != getpid():
+			self._table = get_dynamodb().Table(self.name)
+			self._pid = getpid()
+		return getattr(self._table, attr)
 
 # Amazon's helper class for converting DynamoDB items to JSON
 class DecimalEncoder(json.JSONEncoder):
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+'''
+STORAGE BACKENDS
+Sessions, submits, and aggregates behind one interface,
+stored in Amazon DynamoDB or in a local SQLite file
+'''
+# Import required packages for the backends
+from decimal import Decimal
+import json
+import os
+import threading
+from process_local import SQLiteConnections
+from resource import DecimalEncoder
+
+# Import the DynamoDB model functions
+from inserts import (
+	add_submit_to_aggregates,
+	add_to_aggregate,
+	all_scope,
+	put_session,
+	queue_session,
+	session_writer
+)
+from queries import (
+	get_session_items,
+	get_specific_submit_item,
+	get_submit_aggregate,
+	get_submit_aggregates,
+	query_location_submits,
+	scan_sessions_page,
+	scan_submit_items
+)
+
+
+'''
+DYNAMODB
+'''
+# Backend for the DynamoDB tables, writing through the background writer
+class DynamoDBStorage(object):
+	name = 'dynamodb'
+
+	# Queue an edit for the batch writer, writing submits at once for the results page
+	def put_session(self, data):
+		if data.get('type') == 'submit':
+			put_session(data)
+			return True
+		return queue_session(data)
+
+	# Add a submit's rates to the running sums
+	def add_submit(self, data):
+		add_submit_to_aggregates(data)
+
+	# Add each value to its running sum in a scope's aggregate
+	def add_to_aggregate(self, scope, values):
+		add_to_aggregate(scope, values)
+
+	# Every item of a session in timestamp order
+	def get_session_items(self, session_id):
+		return get_session_items(session_id)
+
+	# Latest submit for the session, or None
+	def get_submit(self, session_id):
+		items = get_specific_submit_item(session_id)
+		return items[0] if items else None
+
+	# Stream every submit
+	def stream_submits(self):
+		return scan_submit_items()
+
+	# Stream the submits of the locations with parallel queries of the location index
+	def stream_location_submits(self, locations):
+		return query_location_submits(locations)
+
+	# Running sums for a scope, or None
+	def get_aggregate(self, scope=all_scope):
+		return get_submit_aggregate(scope)
+
+	# Running sums for each scope that has them, by scope
+	def get_aggregates(self, scopes):
+		return get_submit_aggregates(scopes)
+
+	# One page of every session item after a timestamp, with the key to resume from
+	def scan_sessions(self, start_key=None, since=None, page_size=1000):
+		return scan_sessions_page(start_key, since, page_size)
+
+	# Write everything the background writer has queued
+	def flush(self):
+		session_writer.drain()
+
+	# Counters from the background writer
+	def metrics(self):
+		return session_writer.metrics()
+
+
+'''
+SQLITE
+'''
+# Backend for a local SQLite file in WAL mode, for offline runs and load tests
+class SQLiteStorage(object):
+	name = 'sqlite'
+
+	def __init__(self, path):
+		self.path = path
+		self._connections = SQLiteConnections(path, [
+			'CREATE TABLE IF NOT EXISTS sessions ('
+			'session_id TEXT, timestamp TEXT, location TEXT, type TEXT, '
+			'submitted_at TEXT, item TEXT, PRIMARY KEY (session_id, timestamp))',
+			'CREATE INDEX IF NOT EXISTS sessions_submits '
+			'ON sessions (session_id, submitted_at) WHERE submitted_at IS NOT NULL',
+			'CREATE INDEX IF NOT EXISTS sessions_locations ON sessions (location, type)',
+			'CREATE TABLE IF NOT EXISTS aggregates ('
+			'scope TEXT, name TEXT, total REAL, PRIMARY KEY (scope, name))'
+		])
+		self.writes = 0
+		self.reads = 0
+
+	# One connection per thread and process, creating the tables on first use
+	def _connection(self):
+		return self._connections.get()
+
+	# Write an edit or submit, replacing an item with the same keys
+	def put_session(self, data):
+		self._connection().execute(
+			'INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)',
+			(
+				data['session_id'],
+				data['timestamp'],
+				data.get('location'),
+				data.get('type'),
+				data['timestamp'] if data.get('type') == 'submit' else None,
+				json.dumps(data, cls=DecimalEncoder)
+			)
+		)
+		self.writes += 1
+		return True
+
+	# Add values to the running sums of each scope in one transaction
+	def _add(self, scopes, values):
+		conn = self._connection()
+		conn.execute('BEGIN IMMEDIATE')
+		try:
+			for scope in scopes:
+				for name, value in values.items():
+					conn.execute(
+						'INSERT OR IGNORE INTO aggregates VALUES (?, ?, 0)', (scope, name))
+					conn.execute(
+						'UPDATE aggregates SET total = total + ? WHERE scope = ? AND name = ?',
+						(float(value), scope, name))
+			conn.execute('COMMIT')
+		except Exception:
+			conn.execute('ROLLBACK')
+			raise
+		self.writes += 1
+
+	# Add a submit's rates to the running sums, statewide and for its location
+	def add_submit(self, data):
+		values = dict(data['tax_rates'])
+		values['submit_count'] = 1
+		self._add([all_scope, data['location']], values)
+
+	# Add each value to its running sum in a scope's aggregate
+	def add_to_aggregate(self, scope, values):
+		self._add([scope], values)
+
+	# Every item of a session in timestamp order
+	def get_session_items(self, session_id):
+		rows = self._connection().execute(
+			'SELECT item FROM sessions WHERE session_id = ? ORDER BY timestamp',
+			(session_id,)).fetchall()
+		self.reads += 1
+		return [json.loads(row[0], parse_float=Decimal) for row in rows]
+
+	# Latest submit for the session, or None
+	def get_submit(self, session_id):
+		row = self._connection().execute(
+			'SELECT item FROM sessions WHERE session_id = ? AND submitted_at IS NOT NULL '
+			'ORDER BY submitted_at DESC LIMIT 1', (session_id,)).fetchone()
+		self.reads += 1
+		return json.loads(row[0], parse_float=Decimal) if row else None
+
+	# Stream every submit
+	def stream_submits(self):
+		cursor = self._connection().execute(
+			'SELECT item FROM sessions WHERE submitted_at IS NOT NULL')
+		for row in cursor:
+			yield json.loads(row[0], parse_float=Decimal)
+
+	# Stream the submits of the locations from the location index
+	def stream_location_submits(self, locations):
+		locations = list(locations)
+		cursor = self._connection().execute(
+			'SELECT item FROM sessions WHERE type = ? AND location IN ({})'.format(
+				', '.join('?' * len(locations))), ['submit'] + locations)
+		for row in cursor:
+			yield json.loads(row[0], parse_float=Decimal)
+
+	# One page of every session item after a timestamp, with the rowid to resume from
+	def scan_sessions(self, start_key=None, since=None, page_size=1000):
+		rows = self._connection().execute(
+			'SELECT rowid, item FROM sessions WHERE rowid > ? AND timestamp > ? '
+			'ORDER BY rowid LIMIT ?', (start_key or 0, since or '', page_size)).fetchall()
+		items = [json.loads(row[1], parse_float=Decimal) for row in rows]
+		return items, (rows[-1][0] if len(rows) == page_size else None)
+
+	# Running sums for a scope in the same shape as the DynamoDB item, or None
+	def get_aggregate(self, scope=all_scope):
+		rows = self._connection().execute(
+			'SELECT name, total FROM aggregates WHERE scope = ?', (scope,)).fetchall()
+		self.reads += 1
+		if not rows:
+			return None
+		item = {name: Decimal(repr(total)) for name, total in rows}
+		item['scope'] = scope
+		return item
+
+	# Running sums for each scope that has them, by scope, in one read
+	def get_aggregates(self, scopes):
+		scopes = list(set(scopes))
+		rows = self._connection().execute(
+			'SELECT scope, name, total FROM aggregates WHERE scope IN ({})'.format(
+				', '.join('?' * len(scopes))), scopes).fetchall() if scopes else []
+		self.reads += 1
+		found = {}
+		for scope, name, total in rows:
+			found.setdefault(scope, {'scope': scope})[name] = Decimal(repr(total))
+		return found
+
+	# Every write is made at once, so there is nothing to flush
+	def flush(self):
+		pass
+
+	# Counters for monitoring the backend
+	def metrics(self):
+		return {
+			'path': self.path,
+			'writes': self.writes,
+			'reads': self.reads
+		}
+
+
+'''
+SELECTION
+'''
+# Backend is chosen by environ, DynamoDB unless STORAGE_BACKEND=sqlite
+_storage = None
+_lock = threading.Lock()
+
+# Build the configured backend the first time it is needed
+def get_storage():
+	global _storage
+	if _storage is None:
+		with _lock:
+			if _storage is None:
+				backend = os.environ.get('STORAGE_BACKEND', 'dynamodb')
+				if backend == 'sqlite':
+					_storage = SQLiteStorage(os.environ.get('STORAGE_PATH', 'iltax.db'))
+				elif backend == 'dynamodb':
+					_storage = DynamoDBStorage()
+				else:
+					raise ValueError('Unknown STORAGE_BACKEND {}'.format(backend))
+	return _storage
\ No newline at end of file
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+'''
+AMAZON DYNAMODB BACKGROUND WRITER
+Queues session items and flushes them in batches off the request thread
+'''
+# Import required packages for the write pipeline
+import atexit
+import json
+import logging
+import threading
+import time
+from process_local import ProcessThread
+from resource import DecimalEncoder
+
+# Queue was renamed in Python 3
+try:
+	from Queue import Queue, Full, Empty
+except ImportError:
+	from queue import Queue, Full, Empty
+
+# Failed batches are logged with their items, so they can be written again
+logger = logging.getLogger(__name__)
+
+
+'''
+SESSION WRITER
+'''
+# Bounded queue drained by one thread per process into batch_writer
+class SessionWriter(object):
+	def __init__(
+			self,
+			table,
+			key_names=('session_id', 'timestamp'),
+			max_queue=5000,
+			batch_size=25,  # DynamoDB's limit for BatchWriteItem
+			flush_interval=1.0,
+			put_timeout=0.05,
+			max_attempts=4,
+			retry_delay=0.25
+		):
+		self.table = table
+		self.key_names = key_names
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.put_timeout = put_timeout
+		self.max_attempts = max_attempts
+		self.retry_delay = retry_delay
+		self._queue = Queue(maxsize=max_queue)
+		self._stop = threading.Event()
+		self._thread = ProcessThread(self._run, 'SessionWriter')
+
+		# Counters for the metrics
+		self.enqueued = 0
+		self.written = 0
+		self.coalesced = 0
+		self.overflow = 0
+		self.retries = 0
+		self.errors = 0
+		self.flushes = 0
+		self.last_flush_latency = 0.0
+		self.max_flush_latency = 0.0
+		self.total_flush_latency = 0.0
+
+	# Start the thread lazily, so each gunicorn worker gets its own after fork
+	def _ensure_started(self):
+		self._thread.ensure_started(before_start=self._stop.clear)
+
+	# Queue an item, writing inline when the queue stays full as backpressure
+	def put(self, item):
+		self._ensure_started()
+		try:
+			self._queue.put(item, timeout=self.put_timeout)
+			self.enqueued += 1
+			return True
+		except Full:
+			self.overflow += 1
+			self._flush([item])
+			return False
+
+	# Collect items until the batch is full or the interval passes
+	def _run(self):
+		while not self._stop.is_set() or not self._queue.empty():
+			batch = []
+			deadline = time.time() + self.flush_interval
+			while len(batch) < self.batch_size:
+				remaining = deadline - time.time()
+				if remaining <= 0:
+					break
+				try:
+					batch.append(self._queue.get(timeout=remaining))
+				except Empty:
+					if self._stop.is_set():
+						break
+			if batch:
+				self._flush(batch)
+
+	# Coalesce items with the same key and write them with batch_writer
+	def _flush(self, items):
+		unique = {}
+		for item in items:
+			unique[tuple(item[k] for k in self.key_names)] = item
+		self.coalesced += len(items) - len(unique)
+
+		# Time the flush for the latency metrics
+		start = time.time()
+		for attempt in range(self.max_attempts):
+			try:
+				self._write(unique.values())
+				self.written += len(unique)
+				break
+			except Exception:
+
+				# Back off and retry, e.g. when the table is throttled
+				if attempt + 1 < self.max_attempts:
+					self.retries += 1
+					time.sleep(self.retry_delay * 2 ** attempt)
+					continue
+
+				# Log the items that could not be written instead of losing them silently
+				self.errors += len(unique)
+				logger.exception(
+					'Failed to write %d session items after %d attempts: %s',
+					len(unique), self.max_attempts,
+					json.dumps(list(unique.values()), cls=DecimalEncoder))
+		latency = time.time() - start
+
+		# Update the flush metrics
+		self.flushes += 1
+		self.last_flush_latency = latency
+		self.max_flush_latency = max(self.max_flush_latency, latency)
+		self.total_flush_latency += latency
+
+	# Write the items in batches, overwriting items with the same keys
+	def _write(self, items):
+		with self.table.batch_writer(overwrite_by_pkeys=list(self.key_names)) as batch:
+			for item in items:
+				batch.put_item(Item=item)
+
+	# Stop the thread once it has written everything still queued
+	def drain(self, timeout=10.0):
+		self._stop.set()
+		self._thread.join(timeout)
+
+	# Queue depth, counts, and flush latency for monitoring
+	def metrics(self):
+		return {
+			'queue_depth': self._queue.qsize(),
+			'queue_max': self._queue.maxsize,
+			'enqueued': self.enqueued,
+			'written': self.written,
+			'coalesced': self.coalesced,
+			'overflow': self.overflow,
+			'retries': self.retries,
+			'errors': self.errors,
+			'flushes': self.flushes,
+			'last_flush_latency': self.last_flush_latency,
+			'max_flush_latency': self.max_flush_latency,
+			'avg_flush_latency': self.total_flush_latency / self.flushes if self.flushes else 0.0
+		}
+
+	# Drain the queue when the process exits
+	def register_shutdown(self):
+		atexit.register(self.drain)
+		return self
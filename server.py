@@ -8,18 +8,53 @@ from flask import (
 	Flask, 
 	jsonify,
 	request, 
+	Response,
 	send_from_directory
 )
-import geoip2.database
+import gzip
+import io
+import json
+import logging
 import os
+import tempfile
+import threading
+import time
 
-# Import the model functions
-from models.inserts import *
-from models.queries import *
+# Import the in-process caches, telemetry sampling, and metrics
+from caching import LRUCache, SharedCache, SQLiteCache
+from metrics import (
+	flatten_gauges,
+	instrument_storage,
+	profiler,
+	profiler_enabled,
+	registry,
+	render_prometheus,
+	timed
+)
+from sketches import RateHistogram, histogram_item_scopes
+from telemetry import TelemetrySampler, telemetry_mode
+from trajectories import TrajectoryEngine
+
+# Import the vectorized tax calculations
+import numpy as np
+from tax_engine import calculate_taxes, flat_rates
+
+# Import the storage backend for sessions, submits, and aggregates
+from models.storage import get_storage
 
 # Initialize the Flask app with server name
 app = Flask(__name__, static_folder='static')
 
+# Failed writes that shouldn't fail the request are logged
+logger = logging.getLogger(__name__)
+
+# Storage backend, with every call timed for the metrics
+storage = instrument_storage(get_storage())
+
+# Submitted sessions are added to the trajectory sums in the background
+trajectory_engine = TrajectoryEngine(
+	storage, reader=lambda scope: read_aggregate(scope)).register_shutdown()
+
 
 '''
 STATIC ROUTES
@@ -43,6 +78,21 @@ AMAZON DYNAMODB KVS
 # Triggered by changes to the tax revenue graph or submit button
 def send_kvs_data(data):
 
+	# Slider edits are sampled per session, unless every event is written
+	if data.get('type') != 'submit' and telemetry_mode == 'debounce':
+		telemetry_sampler.offer(data)
+		return
+
+	# Submits write the session's last edit first, so the order is kept
+	telemetry_sampler.flush_session(data['session_id'])
+	write_kvs_data(data)
+
+	# Return nothing to Dash
+	return
+
+# Locate the session and queue the data for kvs
+def write_kvs_data(data):
+
 	# Edit the session for location
 	ip = data.pop('request_ip')
 	city, state = find_ip_loc(ip)
@@ -51,37 +101,222 @@ def send_kvs_data(data):
 	# Convert the tax and income data to decimal for dynamodb
 	data['tax_rates'] = {k:Decimal(str(v)) for k,v in data['tax_rates'].items()}
 	data['income'] = Decimal(str(data['income']))
+	if 'drag_seconds' in data:
+		data['drag_seconds'] = Decimal(str(data['drag_seconds']))
 
-	# Put the data to kvs
-	put_session(data)
+	# Queue the data for the background writer to put to kvs
+	storage.put_session(data)
 
-	# Return nothing to Dash
-	return
+	# Submits also update the running sums and the session cache
+	if data.get('type') == 'submit':
+		storage.add_submit(data)
+		add_submit_histograms(data)
+		cache_submit(data['session_id'], data['tax_rates'], data['location'])
+		trajectory_engine.submit(data['session_id'])
+
+# Sampler collapses each session's slider drags before they are written
+telemetry_sampler = TelemetrySampler(write_kvs_data).register_shutdown()
 
-# Get kvs data from a user's submit for the results page
-def get_session_kvs_data(session_id):
-	data = get_specific_submit_item(session_id)[0]
+# Get kvs data from a user's submit for the results page, or None if it can't be found yet
+def get_session_kvs_data(session_id, attempts=3, delay=0.25):
+
+	# The submit was usually just written, so check the caches first
+	cached = get_cached_submit(session_id)
+	if cached is not None:
+		return cached
+
+	# Otherwise, query for the submit, retrying while the index catches up
+	for attempt in range(attempts):
+		data = storage.get_submit(session_id)
+		if data is not None:
+			break
+		if attempt + 1 < attempts:
+			time.sleep(delay * 2 ** attempt)
+	else:
+		return None
+
+	# Cache the submit for the next request
 	tax_rates = {k:float(v) for k,v in data['tax_rates'].items()}
+	cache_submit(session_id, tax_rates, data['location'])
 	return tax_rates, data['location']
 
-# Get all submitted values and average the tax rates
+# Get all submitted values, statewide or for one or more locations
 def get_all_submit_kvs_data(location=None):
-	data, count = get_all_submit_items()
-	return data, count
+	if location is None:
+		data = list(storage.stream_submits())
+	else:
+		locations = [location] if not isinstance(location, (list, tuple, set)) else location
+		data = list(storage.stream_location_submits(locations))
+	return data, len(data)
+
+# Average the running sums of an aggregate item, with the count of submits
+def aggregate_averages(item):
+	if not item:
+		return {}, 0
+
+	# Every other attribute is the sum for a bracket
+	item = dict(item)
+	count = int(item.pop('submit_count'))
+	item.pop('scope')
+	return {k:float(v) / count for k,v in item.items()}, count
+
+# Average the running sums of submitted rates, statewide or for a location
+def get_submit_averages(location=None):
+	if location is not None:
+		return get_location_averages([location])[location]
+	return aggregate_averages(read_aggregate('ALL'))
+
+# Average rates over the course of submitted sessions, refreshed every 30 seconds
+def get_trajectory_summary():
+	return trajectory_engine.summary()
+
+
+'''
+SESSION CACHE
+'''
+# Submits by session, written through when the submit is sent
+submit_cache = LRUCache(
+	maxsize=int(os.environ.get('SESSION_CACHE_SIZE', 5000)),
+	ttl=float(os.environ.get('SESSION_CACHE_TTL', 60 * 60))
+)
+
+# Shared with the other workers through a local SQLite file, since the results
+# request may reach another worker, unless SESSION_CACHE_PATH is set empty
+submit_cache_path = os.environ.get(
+	'SESSION_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'iltax-submits.db'))
+if submit_cache_path:
+	shared_submit_cache = SQLiteCache(submit_cache_path, ttl=submit_cache.ttl, table='submits')
+else:
+	shared_submit_cache = None
+
+# Add a submit's rates and location to the caches
+def cache_submit(session_id, tax_rates, location):
+	value = ({k:float(v) for k,v in tax_rates.items()}, location)
+	submit_cache.set(session_id, value)
+	if shared_submit_cache is not None:
+		shared_submit_cache.set(session_id, value)
+
+# Get a submit's rates and location from the caches, or None on a miss
+def get_cached_submit(session_id):
+	value = submit_cache.get(session_id)
+	if value is None and shared_submit_cache is not None:
+		value = shared_submit_cache.get(session_id)
+		if value is not None:
+			value = tuple(value)  # JSON returns a list
+			submit_cache.set(session_id, value)
+	return value
+
+
+'''
+SHARED CACHE
+'''
+# Entries shared by the workers on a dyno through a local SQLite file
+shared_cache = SharedCache(
+	os.environ.get('SHARED_CACHE_PATH') or os.path.join(tempfile.gettempdir(), 'iltax-shared.db'),
+	version=os.environ.get('SHARED_CACHE_VERSION', '1')
+)
+
+# Aggregates are reread by one worker at most every AGGREGATE_CACHE_TTL seconds
+aggregate_ttl = float(os.environ.get('AGGREGATE_CACHE_TTL', 10))
+
+# Aggregate item with its sums as JSON numbers
+def json_aggregate(item):
+	return {k:float(v) if isinstance(v, Decimal) else v for k,v in item.items()}
+
+# Running sums for a scope as JSON numbers, or None, through the shared cache
+def read_aggregate(scope):
+	def read():
+		item = storage.get_aggregate(scope)
+		return json_aggregate(item) if item is not None else None
+	return shared_cache.get_or_compute('aggregate:{}'.format(scope), read, ttl=aggregate_ttl)
+
+
+'''
+LOCATION AVERAGES
+'''
+# Averages and counts for each location, cached for LOCATION_CACHE_TTL seconds
+location_cache = LRUCache(
+	maxsize=int(os.environ.get('LOCATION_CACHE_SIZE', 1000)),
+	ttl=float(os.environ.get('LOCATION_CACHE_TTL', 60))
+)
+
+# Averages for several locations, reading the ones missing from the cache in one batch
+def get_location_averages(locations):
+	summaries = {}
+	missing = []
+	for location in locations:
+		summary = location_cache.get(location)
+		if summary is None:
+			missing.append(location)
+		else:
+			summaries[location] = summary
+	if missing:
+		items = storage.get_aggregates(missing)
+		for location in missing:
+			summaries[location] = aggregate_averages(items.get(location))
+			location_cache.set(location, summaries[location])
+	return summaries
+
+
+'''
+RATE HISTOGRAMS
+'''
+# Histograms of the submitted rates by scope, cached like the location averages
+histogram_cache = LRUCache(maxsize=location_cache.maxsize, ttl=location_cache.ttl)
+
+# Count a submit's rates in the statewide and location histograms, logging
+# failed counts so the submit itself still succeeds
+def add_submit_histograms(data):
+	for location in ['ALL', data['location']]:
+		for scope, deltas in RateHistogram.deltas(data['tax_rates'], location).items():
+			try:
+				storage.add_to_aggregate(scope, deltas)
+			except Exception:
+				logger.exception(
+					'Failed to count the submit of session %s in %s', data['session_id'], scope)
+
+# Items of a location's histogram as JSON numbers, in one batch through the shared cache
+def read_histogram_items(location):
+	def read():
+		items = storage.get_aggregates(histogram_item_scopes(location))
+		return [json_aggregate(item) for item in items.values()]
+	return shared_cache.get_or_compute('histogram:{}'.format(location), read, ttl=aggregate_ttl)
+
+# Histogram of the submitted rates, statewide or for a location
+def get_rate_histogram(location=None):
+	location = location or 'ALL'
+	histogram = histogram_cache.get(location)
+	if histogram is None:
+		histogram = RateHistogram.from_aggregates(read_histogram_items(location))
+		histogram_cache.set(location, histogram)
+	return histogram
 
 
 '''
 GEOLOCATION FROM IP
 '''
-# Use GeoIP2 to find the location for the IP
-def find_ip_loc(ip):
-	db_name = 'GeoLite2-City.mmdb'
-	path = os.path.join(app.static_folder, 'data', db_name)
-	reader = geoip2.database.Reader(path)
+# One memory-mapped reader per process and a bounded cache of lookups
+geoip_reader = None
+geoip_lock = threading.Lock()
+geoip_cache = LRUCache(maxsize=10000, ttl=24 * 60 * 60)
 
-	# Return early if we are on local for testing
-	if ip == '127.0.0.1':
-		return 'Local', 'HOST'
+# Open the GeoIP2 database the first time it is needed
+def get_geoip_reader():
+	global geoip_reader
+	if geoip_reader is None:
+		with geoip_lock:
+			if geoip_reader is None:
+				import geoip2.database  # Only loaded by the first lookup
+				db_name = 'GeoLite2-City.mmdb'
+				path = os.path.join(app.static_folder, 'data', db_name)
+				geoip_reader = geoip2.database.Reader(
+					path, mode=geoip2.database.MODE_MMAP)
+	return geoip_reader
+
+# Use GeoIP2 to find the location for the IP
+@timed('geoip')
+def lookup_ip_loc(ip):
+	reader = get_geoip_reader()
 
 	# Try using the city version
 	resp = reader.city(ip)
@@ -93,4 +328,154 @@ def find_ip_loc(ip):
 		return city, country
 	else:
 		state = resp.subdivisions.most_specific.iso_code
-		return city, state
\ No newline at end of file
+		return city, state
+
+# Find the location for the IP, using the cache when possible
+@timed('geoip')
+def find_ip_loc(ip):
+
+	# Return early if we are on local for testing
+	if ip == '127.0.0.1':
+		return 'Local', 'HOST'
+
+	# Look up and cache the location on a miss
+	loc = geoip_cache.get(ip)
+	if loc is None:
+		loc = lookup_ip_loc(ip)
+		geoip_cache.set(ip, loc)
+	return loc
+
+# Hit and miss counters for the location cache
+def geoip_stats():
+	return geoip_cache.stats()
+
+
+'''
+COMPRESSION
+'''
+# Brotli is optional, and gzip is used without it
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+# Text responses over the minimum size are compressed
+compress_min_bytes = int(os.environ.get('COMPRESS_MIN_BYTES', 500))
+compress_level = int(os.environ.get('COMPRESS_LEVEL', 6))
+compress_mimetypes = set([
+	'application/json',
+	'application/javascript',
+	'text/css',
+	'text/html',
+	'text/plain'
+])
+
+# Gzip the data at the compression level
+def gzip_bytes(data):
+	buffer = io.BytesIO()
+	with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=compress_level) as f:
+		f.write(data)
+	return buffer.getvalue()
+
+# Compress with brotli or gzip as the client accepts, recording the sizes
+@app.after_request
+def compress_response(response):
+	if response.direct_passthrough or response.status_code != 200 or \
+			response.mimetype not in compress_mimetypes or \
+			'Content-Encoding' in response.headers:
+		return response  # Files from send_from_directory are streamed as is
+
+	# Small responses cost more to compress than they save
+	data = response.get_data()
+	accept = request.headers.get('Accept-Encoding', '').lower()
+	encoding = 'identity'
+	if len(data) >= compress_min_bytes:
+		if brotli is not None and 'br' in accept:
+			encoding = 'br'
+			response.set_data(brotli.compress(data, quality=min(compress_level, 11)))
+		elif 'gzip' in accept:
+			encoding = 'gzip'
+			response.set_data(gzip_bytes(data))
+		if encoding != 'identity':
+			response.headers['Content-Encoding'] = encoding
+		response.vary.add('Accept-Encoding')
+	registry.observe_response(
+		request.endpoint or 'unknown', encoding, len(data), response.content_length or 0)
+	return response
+
+
+'''
+TAX CALCULATION API
+'''
+# Largest number of AGIs accepted in one request
+max_api_incomes = int(os.environ.get('TAX_API_MAX_INCOMES', 10000000))
+
+# Taxes for many AGIs under many rate schedules, as JSON or as raw float64 arrays
+@app.route('/api/taxes', methods=['POST'])
+@timed('api')
+def api_taxes():
+
+	# Binary bodies are little-endian float64 AGIs, with the rates in the query string
+	binary = request.mimetype == 'application/octet-stream'
+	try:
+		if binary:
+			agis = np.frombuffer(request.get_data(), dtype='<f8')
+			rates = json.loads(request.args.get('rates', 'null'))
+		else:
+			body = request.get_json(force=True)
+			agis = np.asarray(body['agis'], dtype=np.float64)
+			rates = body.get('rates')
+		if agis.size > max_api_incomes:
+			raise ValueError('At most {} AGIs per request'.format(max_api_incomes))
+		liabilities, effective, marginal = calculate_taxes(
+			agis, flat_rates if rates is None else rates)
+	except (KeyError, TypeError, ValueError) as e:
+		return jsonify({'error': str(e)}), 400
+
+	# Binary responses are an .npy array of liabilities, effective, and marginal rates
+	if binary:
+		buffer = io.BytesIO()
+		np.save(buffer, np.stack([liabilities, effective, marginal]))
+		return Response(buffer.getvalue(), mimetype='application/octet-stream')
+
+	# JSON rows are AGIs and columns are rate schedules
+	return jsonify({
+		'liabilities': liabilities.tolist(),
+		'effective_rates': effective.tolist(),
+		'marginal_rates': marginal.tolist()
+	})
+
+
+'''
+METRICS
+'''
+# Prometheus text for the timings of this worker, with the cache and queue stats
+@app.route('/metrics', methods=['GET'])
+def metrics():
+	gauges = {}
+	gauges.update(flatten_gauges('iltax_storage', storage.metrics()))
+	gauges.update(flatten_gauges('iltax_telemetry', telemetry_sampler.metrics()))
+	gauges.update(flatten_gauges('iltax_geoip_cache', geoip_stats()))
+	gauges.update(flatten_gauges('iltax_submit_cache', submit_cache.stats()))
+	gauges.update(flatten_gauges('iltax_location_cache', location_cache.stats()))
+	gauges.update(flatten_gauges('iltax_histogram_cache', histogram_cache.stats()))
+	gauges.update(flatten_gauges('iltax_shared_cache', shared_cache.stats()))
+	gauges.update(flatten_gauges('iltax_trajectory', trajectory_engine.metrics()))
+	return Response(render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
+# Sampling profiler, only routed when enabled, as its stacks expose the code
+if profiler_enabled:
+
+	# Start in each worker, since threads don't survive gunicorn's fork
+	@app.before_request
+	def start_profiler():
+		if not profiler.running():
+			profiler.start()
+
+	# Collapsed stacks for a flame graph, optionally clearing them
+	@app.route('/metrics/profile', methods=['GET'])
+	def profile():
+		text = profiler.collapsed(top=request.args.get('top', type=int))
+		if request.args.get('clear'):
+			profiler.clear()
+		return Response(text, mimetype='text/plain')
\ No newline at end of file
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+'''
+RATE HISTOGRAMS
+Mergeable distributions of the submitted rates for each bracket,
+binned at the resolution of the rates so the quantiles are exact
+'''
+# Import required packages for the histograms
+from collections import defaultdict
+import numpy as np
+
+# Import the bracket labels in slider order
+from agi_data import x
+
+
+'''
+SETTINGS
+'''
+# Rates are rounded to 0.01%, by the text inputs and the presets, so every rate has its own bin
+bin_width = 0.0001
+bin_count = int(round(1.0 / bin_width)) + 1
+
+# Each bracket's bins are split across items, since all 10001 bins of the five brackets
+# would pass DynamoDB's 400 KB item limit, and each ADD is billed by the size of the whole
+# item. An item of 250 counts stays under 3 KB, so a submit costs a few write units at most.
+bins_per_item = 250
+parts_per_bracket = (bin_count + bins_per_item - 1) // bins_per_item
+
+# Aggregate scope for a location, versioned by the bins so changing them starts new counts
+def histogram_scope(location='ALL'):
+	return 'HISTOGRAM-{:g}-{}-{}'.format(bin_width, bins_per_item, location)
+
+# Scope of the item holding a bracket's counts for one range of bins
+def histogram_item_scope(location, bracket, part):
+	return '{}-{}-{}'.format(histogram_scope(location), bracket, part)
+
+# Scopes of every item of a location's histogram, for reading them in one batch
+def histogram_item_scopes(location='ALL'):
+	return [
+		histogram_item_scope(location, i, part)
+		for i in range(len(x)) for part in range(parts_per_bracket)
+	]
+
+
+'''
+HISTOGRAM
+'''
+# Counts of the submitted rates in each bin for each bracket
+class RateHistogram(object):
+	def __init__(self, counts=None):
+		self.counts = np.zeros((len(x), bin_count), dtype=np.int64) if counts is None else counts
+
+	# Bin of each rate, clipped to the slider range
+	@staticmethod
+	def bins(tax_rates):
+		rates = np.array([float(tax_rates[k]) for k in x])
+		return np.clip(np.round(rates / bin_width).astype(int), 0, bin_count - 1)
+
+	# Counts to add to the aggregates for one submit, by item scope
+	@staticmethod
+	def deltas(tax_rates, location='ALL'):
+		return {
+			histogram_item_scope(location, i, b // bins_per_item): {'h{}_{}'.format(i, b): 1}
+			for i, b in enumerate(RateHistogram.bins(tax_rates))
+		}
+
+	# Histogram from the counts of a location's items, empty without them
+	@classmethod
+	def from_aggregates(cls, items):
+		histogram = cls()
+		for item in items:
+			for name, count in item.items():
+				if name.startswith('h'):
+					i, b = name[1:].split('_')
+					histogram.counts[int(i), int(b)] = int(count)
+		return histogram
+
+	# Counts of the bins with submits by item scope, for rebuilding the aggregates
+	def items(self, location='ALL'):
+		items = defaultdict(dict)
+		for i, b in zip(*self.counts.nonzero()):
+			scope = histogram_item_scope(location, i, b // bins_per_item)
+			items[scope]['h{}_{}'.format(i, b)] = int(self.counts[i, b])
+		return items
+
+	# Add one submit's rates
+	def add(self, tax_rates):
+		self.counts[np.arange(len(x)), self.bins(tax_rates)] += 1
+		return self
+
+	# Add the counts of another histogram, e.g. from another location
+	def merge(self, other):
+		self.counts += other.counts
+		return self
+
+	# Number of submits counted
+	def total(self):
+		return int(self.counts[0].sum())
+
+	# Lowest rate at or below which a share q of the submits fall, for each bracket
+	def quantile(self, q):
+		total = self.total()
+		if not total:
+			return np.zeros(len(x))
+		cumulative = self.counts.cumsum(axis=1)
+		target = max(q * total, 1)
+		return (cumulative >= target).argmax(axis=1) * bin_width
+
+	# Share of the submits in each bin, for plotting the distributions
+	def density(self):
+		total = self.total()
+		return self.counts / float(total) if total else self.counts.astype(float)
\ No newline at end of file
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+'''
+TAX REVENUE ENGINE
+Shared by the Dash apps to apply slider rates to the AGI data
+'''
+# Import packages for calculation
+import numpy as np
+
+# Import the AGI data shared by every module
+from agi_data import agi_matrix, x
+
+
+'''
+IL BRACKETS
+'''
+# IL Brackets used for tax calc and graph calc
+brackets = [
+	[0, 25000],
+	[25000, 50000],
+	[50000, 100000],
+	[100000, 500000],
+	[500000, 1000000000000]  # Trillion is the max input
+]
+
+# Current IL flat tax rate for every bracket
+flat_rates = [0.0495] * 5
+
+# Bracket bounds as arrays for the vectorized calculations
+bracket_lower = np.array([b[0] for b in brackets], dtype=np.float64)
+bracket_width = np.array([b[1] - b[0] for b in brackets], dtype=np.float64)
+
+
+'''
+REVENUE CALCULATIONS
+'''
+# Convert the slider values to a rate vector for the matrix
+def rate_vector(rates):
+	return np.asarray(rates, dtype=np.float64)
+
+# Revenue from each income band in each AGI range, used by the stacked bars
+def revenue_matrix(rates):
+	return agi_matrix * rate_vector(rates)  # Broadcast across the columns
+
+# Revenue from each AGI range with one matrix-vector product
+def bracket_revenue(rates):
+	return agi_matrix.dot(rate_vector(rates))
+
+
+'''
+TAX CALCULATIONS
+'''
+# Calculate the total tax charged, given an AGI
+def calculate_tax(agi, taxes):
+
+	# Iterate across the income brackets
+	tax = 0
+	for i, b in enumerate(brackets):
+		if b[0] < agi:
+
+			# Calculate the tax
+			amt = min(b[1], agi) - b[0]
+			tax += amt * taxes[i]
+
+	# Return the tax
+	return tax
+
+# Taxes for arrays of AGIs under each rate schedule in one pass, in chunks to bound memory
+def calculate_taxes(agis, rate_schedules, chunk_size=1000000):
+	agis = np.asarray(agis, dtype=np.float64).ravel()
+	schedules = np.atleast_2d(np.asarray(rate_schedules, dtype=np.float64))
+	if schedules.shape[1] != len(brackets):
+		raise ValueError('Each rate schedule needs {} rates'.format(len(brackets)))
+
+	# Rows are AGIs and columns are rate schedules
+	liabilities = np.empty((agis.size, schedules.shape[0]))
+	for start in range(0, agis.size, chunk_size):
+		chunk = agis[start:start + chunk_size]
+
+		# Income taxed in each bracket, as in calculate_tax
+		amounts = np.clip(chunk[:, None] - bracket_lower, 0, bracket_width)
+		liabilities[start:start + chunk_size] = amounts.dot(schedules.T)
+
+	# Effective rate is zero without income
+	with np.errstate(divide='ignore', invalid='ignore'):
+		effective = np.where(agis[:, None] > 0, liabilities / agis[:, None], 0.0)
+
+	# Marginal rate applies to the next dollar, so bracket bounds round up
+	index = np.searchsorted(bracket_lower, agis, side='right') - 1
+	marginal = schedules.T[np.clip(index, 0, len(brackets) - 1)]
+	return liabilities, effective, marginal
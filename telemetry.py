@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+'''
+TELEMETRY SAMPLING
+Collapses each session's slider drags before they are written to kvs
+'''
+# Import required packages for the sampler
+import atexit
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+
+# Import the lazily started thread
+from models.process_local import ProcessThread
+
+
+# Edits that fail before they reach the writer are logged
+logger = logging.getLogger(__name__)
+
+
+'''
+SETTINGS
+'''
+# Mode is debounce by default, or all to write every slider event
+telemetry_mode = os.environ.get('TELEMETRY_MODE', 'debounce')
+debounce_seconds = float(os.environ.get('TELEMETRY_DEBOUNCE_SECONDS', 1.5))
+max_wait_seconds = float(os.environ.get('TELEMETRY_MAX_WAIT_SECONDS', 10.0))
+max_pending_sessions = int(os.environ.get('TELEMETRY_MAX_PENDING', 10000))
+
+
+'''
+SAMPLER
+'''
+# Per-session debounce that keeps the final value of each drag
+class TelemetrySampler(object):
+	def __init__(
+			self,
+			emit,
+			window=debounce_seconds,
+			max_wait=max_wait_seconds,
+			max_pending=max_pending_sessions
+		):
+		self.emit = emit
+		self.window = window
+		self.max_wait = max_wait
+		self.max_pending = max_pending
+		self._pending = OrderedDict()  # session_id -> [data, first seen, last seen, count]
+		self._last_rates = OrderedDict()  # session_id -> last rates emitted
+		self._lock = threading.Lock()
+		self._thread = ProcessThread(self._run, 'TelemetrySampler')
+
+		# Counters for the metrics
+		self.received = 0
+		self.duplicates = 0
+		self.emitted = 0
+		self.errors = 0
+
+	# Start the flush thread lazily, so each gunicorn worker gets its own
+	def _ensure_started(self):
+		self._thread.ensure_started()
+
+	# Hold the event as the session's pending edit, replacing any earlier one
+	def offer(self, data):
+		self._ensure_started()
+		session_id = data['session_id']
+		now = time.time()
+		overflow = []
+		with self._lock:
+			self.received += 1
+
+			# Identical consecutive rate vectors add nothing, so drop them
+			if session_id not in self._pending and \
+					self._last_rates.get(session_id) == data['tax_rates']:
+				self.duplicates += 1
+				return
+			pending = self._pending.pop(session_id, None)
+			if pending is None:
+				pending = [data, now, now, 0]
+			pending[0] = data
+			pending[2] = now
+			pending[3] += 1
+			self._pending[session_id] = pending
+
+			# Emit the oldest sessions to keep memory bounded
+			while len(self._pending) > self.max_pending:
+				overflow.append(self._pending.popitem(last=False)[1])
+		for pending in overflow:
+			self._emit(pending)
+
+	# Emit a session's pending edit now, e.g. before its submit
+	def flush_session(self, session_id):
+		with self._lock:
+			pending = self._pending.pop(session_id, None)
+		if pending is not None:
+			self._emit(pending)
+
+	# Emit every pending edit, e.g. at shutdown
+	def flush_all(self):
+		with self._lock:
+			pending = list(self._pending.values())
+			self._pending.clear()
+		for p in pending:
+			self._emit(p)
+
+	# Record how many events the edit stands for and how long the drag lasted
+	def _emit(self, pending):
+		data, first, last, count = pending
+		data['drag_events'] = count
+		data['drag_seconds'] = round(last - first, 3)
+		with self._lock:
+			self._last_rates.pop(data['session_id'], None)
+			self._last_rates[data['session_id']] = data['tax_rates']
+			while len(self._last_rates) > self.max_pending:
+				self._last_rates.popitem(last=False)
+
+		# A failed edit is logged and counted, so it can't fail a submit, another
+		# session's request, or the edits flushed after it, e.g. after a failed GeoIP lookup
+		try:
+			self.emit(data)
+		except Exception:
+			self.errors += 1
+			logger.exception('Failed to emit the edit for session %s', data['session_id'])
+			return
+		self.emitted += 1  # Only once the edit is handed off
+
+	# Emit edits once the drag is idle for the window, or after the max wait
+	def _run(self):
+		while True:
+			time.sleep(self.window / 2.0)
+			now = time.time()
+			with self._lock:
+				ready = [
+					k for k, (data, first, last, count) in self._pending.items()
+					if now - last >= self.window or now - first >= self.max_wait
+				]
+				ready = [self._pending.pop(k) for k in ready]
+			for pending in ready:
+				self._emit(pending)
+
+	# Counts and pending sessions for monitoring
+	def metrics(self):
+		return {
+			'mode': telemetry_mode,
+			'received': self.received,
+			'duplicates': self.duplicates,
+			'emitted': self.emitted,
+			'errors': self.errors,
+			'pending_sessions': len(self._pending)
+		}
+
+	# Emit pending edits when the process exits
+	def register_shutdown(self):
+		atexit.register(self.flush_all)
+		return self
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+'''
+TEST SETUP
+Puts the app on the path, and the models for their implicit relative imports under Python 3
+'''
+# Import required packages for the path
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(root, 'models'), root):
+	if path not in sys.path:
+		sys.path.insert(0, path)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+SHARED CACHE TESTS
+Each SharedCache on the same file stands in for a gunicorn worker
+'''
+# Import required packages for the tests
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from caching import SharedCache
+
+
+'''
+TESTS
+'''
+class SharedCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, 'shared.db')
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_one_worker_computes_under_contention(self):
+		calls = []
+		results = []
+		def compute():
+			calls.append(1)
+			time.sleep(0.2)
+			return 42
+		def worker():
+			results.append(SharedCache(self.path).get_or_compute('figure', compute, ttl=60))
+		threads = [threading.Thread(target=worker) for _ in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(len(calls), 1)
+		self.assertEqual(results, [42] * 4)
+
+	def test_stale_entry_is_served_while_another_worker_recomputes(self):
+		holder = SharedCache(self.path)
+		worker = SharedCache(self.path)
+		key = holder.key('figure')
+		holder.store.set(key, 'old', ttl=-1)
+		self.assertTrue(holder.store.acquire(key, 30))
+		self.assertEqual(worker.get_or_compute('figure', lambda: 'new'), 'old')
+		self.assertEqual(worker.stats()['stale'], 1)
+
+	def test_worker_that_gives_up_waiting_keeps_the_other_lease(self):
+		holder = SharedCache(self.path)
+		worker = SharedCache(self.path, wait_seconds=0.1)
+		key = holder.key('figure')
+		self.assertTrue(holder.store.acquire(key, 30))
+		self.assertEqual(worker.get_or_compute('figure', lambda: 'new'), 'new')
+		self.assertEqual(worker.stats()['waits'], 1)
+		self.assertFalse(SharedCache(self.path).store.acquire(key, 30))
+
+	def test_lease_is_released_after_a_failed_compute(self):
+		cache = SharedCache(self.path)
+		def compute():
+			raise ValueError('no aggregate')
+		self.assertRaises(ValueError, cache.get_or_compute, 'figure', compute)
+		self.assertTrue(cache.store.acquire(cache.key('figure'), 30))
+
+	def test_version_change_recomputes(self):
+		cache = SharedCache(self.path)
+		self.assertEqual(cache.get_or_compute('figure', lambda: 1, version='a'), 1)
+		self.assertEqual(cache.get_or_compute('figure', lambda: 2, version='a'), 1)
+		self.assertEqual(cache.get_or_compute('figure', lambda: 2, version='b'), 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+'''
+TELEMETRY SAMPLER TESTS
+Collapses slider drags into a list instead of the writer
+'''
+# Import required packages for the tests
+import time
+import unittest
+
+from telemetry import TelemetrySampler
+
+
+# Slider event for a session
+def event(session_id, rate):
+	return {'session_id': session_id, 'type': 'edit', 'tax_rates': {'0': rate}}
+
+# Wait until the condition holds or the seconds pass
+def wait_for(condition, seconds=2.0):
+	deadline = time.time() + seconds
+	while not condition() and time.time() < deadline:
+		time.sleep(0.01)
+	return condition()
+
+
+'''
+TESTS
+'''
+class TelemetrySamplerTest(unittest.TestCase):
+	def test_drag_is_emitted_once_with_its_final_value(self):
+		emitted = []
+		sampler = TelemetrySampler(emitted.append, window=0.05, max_wait=5)
+		for rate in range(10):
+			sampler.offer(event('s', rate))
+		self.assertTrue(wait_for(lambda: emitted))
+		time.sleep(0.1)
+		self.assertEqual(len(emitted), 1)
+		self.assertEqual(emitted[0]['tax_rates'], {'0': 9})
+		self.assertEqual(emitted[0]['drag_events'], 10)
+		self.assertEqual(sampler.metrics()['emitted'], 1)
+
+	def test_unchanged_rates_are_dropped(self):
+		emitted = []
+		sampler = TelemetrySampler(emitted.append, window=60, max_wait=60)
+		sampler.offer(event('s', 1))
+		sampler.flush_session('s')
+		sampler.offer(event('s', 1))
+		self.assertEqual(sampler.metrics()['duplicates'], 1)
+		self.assertEqual(sampler.metrics()['pending_sessions'], 0)
+
+	def test_flush_session_emits_only_that_session(self):
+		emitted = []
+		sampler = TelemetrySampler(emitted.append, window=60, max_wait=60)
+		sampler.offer(event('a', 1))
+		sampler.offer(event('b', 2))
+		sampler.flush_session('a')
+		self.assertEqual([e['session_id'] for e in emitted], ['a'])
+		sampler.flush_all()
+		self.assertEqual([e['session_id'] for e in emitted], ['a', 'b'])
+
+	def test_oldest_sessions_are_emitted_over_max_pending(self):
+		emitted = []
+		sampler = TelemetrySampler(emitted.append, window=60, max_wait=60, max_pending=2)
+		for session_id in 'abc':
+			sampler.offer(event(session_id, 1))
+		self.assertEqual([e['session_id'] for e in emitted], ['a'])
+
+	def test_failed_emit_is_counted_and_the_thread_keeps_running(self):
+		emitted = []
+		def emit(data):
+			if data['session_id'] == 'bad':
+				raise ValueError('GeoIP lookup failed')
+			emitted.append(data)
+		sampler = TelemetrySampler(emit, window=0.05, max_wait=5)
+		sampler.offer(event('bad', 1))
+		self.assertTrue(wait_for(lambda: sampler.metrics()['errors'] == 1))
+		sampler.offer(event('good', 1))
+		self.assertTrue(wait_for(lambda: emitted))
+		self.assertEqual(sampler.metrics()['emitted'], 1)
+
+	def test_failing_pending_edit_does_not_block_the_flush(self):
+		emitted = []
+		def emit(data):
+			if data['session_id'] == 'bad':
+				raise ValueError('income is None')
+			emitted.append(data)
+		sampler = TelemetrySampler(emit, window=60, max_wait=60)
+		sampler.offer(event('bad', 1))
+		sampler.offer(event('good', 1))
+		sampler.flush_all()
+		self.assertEqual([e['session_id'] for e in emitted], ['good'])
+
+		# The submit that flushes the failing edit still goes ahead
+		sampler.offer(event('bad', 2))
+		sampler.flush_session('bad')
+		self.assertEqual(sampler.metrics()['errors'], 2)
+		self.assertEqual(sampler.metrics()['emitted'], 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+'''
+SESSION WRITER TESTS
+Runs the background writer against an in-memory stand-in for a DynamoDB table
+'''
+# Import required packages for the tests
+import logging
+import threading
+import unittest
+
+from models.writer import SessionWriter
+
+
+'''
+TABLE STAND-IN
+'''
+# Table whose batch_writer keeps the items by key, failing the first few batches if asked
+class FakeTable(object):
+	def __init__(self, failures=0):
+		self.items = {}
+		self.batches = []
+		self.failures = failures
+		self._lock = threading.Lock()
+
+	def batch_writer(self, overwrite_by_pkeys=None):
+		return FakeBatch(self, overwrite_by_pkeys)
+
+
+# Buffers the puts and applies them on exit, like boto3's batch writer
+class FakeBatch(object):
+	def __init__(self, table, key_names):
+		self.table = table
+		self.key_names = key_names
+		self.items = []
+
+	def __enter__(self):
+		return self
+
+	def put_item(self, Item):
+		self.items.append(Item)
+
+	def __exit__(self, *exc):
+		with self.table._lock:
+			if self.table.failures:
+				self.table.failures -= 1
+				raise IOError('ProvisionedThroughputExceededException')
+			self.table.batches.append(len(self.items))
+			for item in self.items:
+				self.table.items[tuple(item[k] for k in self.key_names)] = item
+		return False
+
+
+# Handler that keeps the writer's log records
+class ListHandler(logging.Handler):
+	def __init__(self):
+		logging.Handler.__init__(self)
+		self.records = []
+
+	def emit(self, record):
+		self.records.append(record)
+
+
+# Session edit item
+def edit(session_id, timestamp, rate=5):
+	return {'session_id': session_id, 'timestamp': timestamp, 'type': 'edit', 'tax_rates': {'0': rate}}
+
+
+'''
+TESTS
+'''
+class SessionWriterTest(unittest.TestCase):
+	def test_drain_writes_everything_queued(self):
+		table = FakeTable()
+		writer = SessionWriter(table, flush_interval=0.05)
+		for i in range(60):
+			writer.put(edit('s{}'.format(i % 3), '2019-05-01T00:00:{:02d}'.format(i)))
+		writer.drain()
+		self.assertEqual(len(table.items), 60)
+		self.assertTrue(max(table.batches) <= 25)
+		self.assertEqual(writer.metrics()['written'], 60)
+
+	def test_flush_coalesces_items_with_the_same_key(self):
+		table = FakeTable()
+		writer = SessionWriter(table)
+		writer._flush([edit('s', 't', 1), edit('s', 't', 2), edit('s', 'u', 3)])
+		self.assertEqual(table.batches, [2])
+		self.assertEqual(table.items[('s', 't')]['tax_rates'], {'0': 2})
+		self.assertEqual(writer.coalesced, 1)
+
+	def test_full_queue_writes_inline(self):
+		table = FakeTable()
+		writer = SessionWriter(table, max_queue=1, put_timeout=0.01)
+		writer._thread.ensure_started = lambda before_start=None: None  # Leave the queue undrained
+		self.assertTrue(writer.put(edit('s', 't1')))
+		self.assertFalse(writer.put(edit('s', 't2')))
+		self.assertEqual(list(table.items), [('s', 't2')])
+		self.assertEqual(writer.overflow, 1)
+
+	def test_failed_batch_is_retried(self):
+		table = FakeTable(failures=2)
+		writer = SessionWriter(table, retry_delay=0.001)
+		writer._flush([edit('s', 't')])
+		self.assertEqual(list(table.items), [('s', 't')])
+		self.assertEqual(writer.retries, 2)
+		self.assertEqual(writer.errors, 0)
+
+	def test_batch_that_keeps_failing_is_logged(self):
+		table = FakeTable(failures=3)
+		writer = SessionWriter(table, max_attempts=3, retry_delay=0.001)
+		handler = ListHandler()
+		logger = logging.getLogger('models.writer')
+		logger.addHandler(handler)
+		try:
+			writer._flush([edit('s', 't')])
+		finally:
+			logger.removeHandler(handler)
+		self.assertEqual(table.items, {})
+		self.assertEqual(writer.errors, 1)
+		self.assertEqual(len(handler.records), 1)
+		self.assertIn('"session_id": "s"', handler.records[0].getMessage())
+
+	def test_put_after_drain_starts_a_new_thread(self):
+		table = FakeTable()
+		writer = SessionWriter(table, flush_interval=0.05)
+		writer.put(edit('s', 't1'))
+		writer.drain()
+		writer.put(edit('s', 't2'))
+		writer.drain()
+		self.assertEqual(len(table.items), 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+'''
+SESSION TRAJECTORIES
+Pre-aggregates how submitted sessions moved their rates over time,
+so the results page reads a few small arrays
+'''
+# Import required packages for the trajectories
+import atexit
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import numpy as np
+import os
+import threading
+import time
+
+# Import the bracket labels, the cache for the summary, and the lazily started thread
+from agi_data import x
+from caching import LRUCache
+from models.process_local import ProcessThread
+
+# Sessions that fail to process are logged, since their sums are then missing or partial
+logger = logging.getLogger(__name__)
+
+
+'''
+SETTINGS
+'''
+# Sessions are bucketed by time since their first event, with the last bucket open ended
+bucket_seconds = float(os.environ.get('TRAJECTORY_BUCKET_SECONDS', 15))
+bucket_count = int(os.environ.get('TRAJECTORY_BUCKETS', 40))
+
+# Submits are processed after the writers have flushed the session's edits
+delay_seconds = float(os.environ.get('TRAJECTORY_DELAY_SECONDS', 30))
+
+# Aggregate scope, versioned by the buckets so changing them starts new sums
+trajectory_scope = 'TRAJECTORY-{:g}-{}'.format(bucket_seconds, bucket_count)
+
+
+'''
+PER-SESSION DELTAS
+'''
+# Datetime for an isoformat timestamp, which leaves out zero microseconds
+def parse_timestamp(timestamp):
+	if '.' in timestamp:
+		return datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S.%f')
+	return datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S')
+
+# Rate vector of an item in slider order
+def item_rates(item):
+	return np.array([float(item['tax_rates'][k]) for k in x])
+
+# Sums to add to the aggregate for one submitted session, or None without a submit
+def session_deltas(items):
+	items = sorted(items, key=lambda i: i['timestamp'])
+	submits = [i for i in items if i.get('type') == 'submit']
+	if not submits:
+		return None
+	submit = submits[-1]
+	final = item_rates(submit)
+
+	# Bucket of each event up to the submit
+	start = parse_timestamp(items[0]['timestamp'])
+	def bucket(item):
+		elapsed = (parse_timestamp(item['timestamp']) - start).total_seconds()
+		return min(int(elapsed // bucket_seconds), bucket_count - 1)
+	events = [(bucket(i), item_rates(i)) for i in items if i['timestamp'] <= submit['timestamp']]
+	last = bucket(submit)
+
+	# Rates held at the end of each bucket, carried through idle buckets
+	held = np.empty((last + 1, len(x)))
+	current = events[0][1]
+	k = 0
+	for b, rates in events:
+		while k < b:
+			held[k] = current
+			k += 1
+		current = rates
+	held[k:] = current
+
+	# Rate sums, active sessions, and distance from the submit for each bucket
+	deltas = {'sessions': 1, 's{}'.format(last): 1}
+	distance = np.abs(held - final).mean(axis=1)
+	for k in range(last + 1):
+		deltas['n{}'.format(k)] = 1
+		deltas['d{}'.format(k)] = float(distance[k])
+		for i in range(len(x)):
+			deltas['r{}_{}'.format(k, i)] = float(held[k, i])
+	return deltas
+
+
+'''
+SUMMARY ARRAYS
+'''
+# Means for each bucket a session was active in, from the aggregate's sums
+def summary_arrays(item):
+	item = item or {}
+	def column(name):
+		return np.array([float(item.get(name.format(k), 0)) for k in range(bucket_count)])
+	counts = column('n{}')
+	active = counts > 0
+	sessions = float(item.get('sessions', 0))
+	sums = np.array([column('r{{}}_{}'.format(i)) for i in range(len(x))]).T
+
+	# Share of sessions that had submitted by the end of each bucket
+	submitted = np.cumsum(column('s{}')) / sessions if sessions else np.zeros(bucket_count)
+	return {
+		'minutes': (np.arange(bucket_count)[active] * bucket_seconds / 60.0),
+		'mean_rates': sums[active] / counts[active, None],
+		'distance': column('d{}')[active] / counts[active],
+		'submitted': submitted[active],
+		'sessions': int(sessions)
+	}
+
+
+'''
+ENGINE
+'''
+# Processes submitted sessions in the background and serves the cached summary
+class TrajectoryEngine(object):
+	def __init__(self, storage, delay=delay_seconds, max_pending=10000, summary_ttl=30, reader=None):
+		self.storage = storage
+		self.read_aggregate = reader or storage.get_aggregate
+		self.delay = delay
+		self.max_pending = max_pending
+		self._pending = OrderedDict()  # session_id -> time due
+		self._summary = LRUCache(maxsize=1, ttl=summary_ttl)
+		self._lock = threading.Lock()
+		self._thread = ProcessThread(self._run, 'TrajectoryEngine')
+
+		# Counters for the metrics
+		self.processed = 0
+		self.skipped = 0
+		self.dropped = 0
+		self.errors = 0
+
+	# Start the thread lazily, so each gunicorn worker gets its own
+	def _ensure_started(self):
+		self._thread.ensure_started()
+
+	# Schedule a submitted session, restarting its delay if it submits again
+	def submit(self, session_id):
+		self._ensure_started()
+		with self._lock:
+			self._pending.pop(session_id, None)
+			self._pending[session_id] = time.time() + self.delay
+			while len(self._pending) > self.max_pending:
+				self._pending.popitem(last=False)
+				self.dropped += 1
+
+	# Add one session's trajectory to the aggregate
+	def process(self, session_id):
+		deltas = session_deltas(self.storage.get_session_items(session_id))
+		if deltas is None:
+			self.skipped += 1
+			return
+		self.storage.add_to_aggregate(trajectory_scope, deltas)
+		self.processed += 1
+
+	# Process sessions once their delay has passed, oldest first
+	def _run(self):
+		while True:
+			time.sleep(min(self.delay, 1.0))
+			now = time.time()
+			with self._lock:
+				due = [k for k, t in self._pending.items() if t <= now]
+				for k in due:
+					self._pending.pop(k)
+			for session_id in due:
+				self._process_logged(session_id)  # Keeps the thread alive
+
+	# Process every pending session at once, after the storage has written its queued edits
+	def drain(self, timeout=10.0):
+		deadline = time.time() + timeout
+		with self._lock:
+			pending = list(self._pending)
+			self._pending.clear()
+		if not pending:
+			return
+		self.storage.flush()
+		dropped = 0
+		for session_id in pending:
+			if time.time() > deadline:
+				dropped += 1
+				continue
+			self._process_logged(session_id)
+		if dropped:
+			self.dropped += dropped
+			logger.warning('Dropped %d sessions still pending after %gs at shutdown', dropped, timeout)
+
+	# Process a session, counting and logging a failure instead of raising it
+	def _process_logged(self, session_id):
+		try:
+			self.process(session_id)
+		except Exception:
+			self.errors += 1
+			logger.exception('Failed to add the trajectory of session %s', session_id)
+
+	# Summary arrays for the results page, read from the aggregate at most every ttl
+	def summary(self):
+		summary = self._summary.get('summary')
+		if summary is None:
+			summary = summary_arrays(self.read_aggregate(trajectory_scope))
+			self._summary.set('summary', summary)
+		return summary
+
+	# Counts and pending sessions for monitoring
+	def metrics(self):
+		return {
+			'processed': self.processed,
+			'skipped': self.skipped,
+			'dropped': self.dropped,
+			'errors': self.errors,
+			'pending_sessions': len(self._pending)
+		}
+
+	# Process the pending sessions when the process exits, instead of losing them
+	def register_shutdown(self):
+		atexit.register(self.drain)
+		return self
\ No newline at end of file